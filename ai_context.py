@@ -0,0 +1,209 @@
+"""Compact, question-specific context for the Gemini assistant.
+
+Instead of pasting every city and cargo name into the prompt, the assistant
+context is assembled from three pieces:
+
+- a statistical digest (salary quantiles per cargo/city/category, vacancy
+  totals), precomputed for the whole dataset and recomputed only for the
+  rows left by the user's filters;
+- BM25 ranking on the dashboard's search index (search_index.py), used to
+  pick the jobs that actually relate to the question;
+- a token budget, so sections are added by relevance until it is spent.
+"""
+import pandas as pd
+
+from gazetteer import find_cities
+from search_index import SearchIndex
+
+DEFAULT_TOKEN_BUDGET = 1500
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is a good enough estimate for budgeting
+    return len(text) // 4 + 1
+
+
+def job_rows(dataframe):
+    """One row per OPEC (the dashboard frame has one row per OPEC and city)"""
+    if "opec" in dataframe.columns:
+        return dataframe.drop_duplicates("opec")
+    return dataframe
+
+
+def salary_quantiles(jobs, by):
+    """Salary count/min/p25/median/p75/max per group, largest groups first"""
+    if jobs.empty or by not in jobs.columns:
+        return pd.DataFrame()
+    grouped = jobs.groupby(by, observed=True)["salario"]
+    table = pd.DataFrame({
+        "empleos": grouped.size(),
+        "min": grouped.min(),
+        "p25": grouped.quantile(0.25),
+        "mediana": grouped.median(),
+        "p75": grouped.quantile(0.75),
+        "max": grouped.max(),
+    })
+    return table.sort_values("empleos", ascending=False)
+
+
+def compute_digest(dataframe):
+    """Aggregates the assistant can quote without seeing individual rows"""
+    jobs = job_rows(dataframe)
+    digest = {
+        "empleos": len(jobs),
+        "vacantes": int(dataframe["vacantes_count"].sum()) if "vacantes_count" in dataframe.columns else len(jobs),
+        "ciudades": dataframe["ciudad"].nunique() if "ciudad" in dataframe.columns else 0,
+        "salario_min": float(jobs["salario"].min()) if not jobs.empty else 0.0,
+        "salario_max": float(jobs["salario"].max()) if not jobs.empty else 0.0,
+        "salario_mediana": float(jobs["salario"].median()) if not jobs.empty else 0.0,
+        "por_cargo": salary_quantiles(jobs, "cargo"),
+        "por_categoria": salary_quantiles(jobs, "categoria"),
+        "por_convocatoria": salary_quantiles(jobs, "convocatoria"),
+    }
+    if "ciudad" in dataframe.columns and not dataframe.empty:
+        by_city = dataframe.groupby("ciudad", observed=True)
+        digest["por_ciudad"] = pd.DataFrame({
+            "vacantes": by_city["vacantes_count"].sum() if "vacantes_count" in dataframe.columns else by_city.size(),
+            "empleos": by_city["opec"].nunique() if "opec" in dataframe.columns else by_city.size(),
+            "mediana": by_city["salario"].median(),
+        }).sort_values("vacantes", ascending=False)
+    else:
+        digest["por_ciudad"] = pd.DataFrame()
+    return digest
+
+
+def money(value):
+    return f"${value:,.0f}"
+
+
+class ContextBuilder:
+    """Builds the data section of the assistant prompt for one question"""
+
+    def __init__(self, dataframe, jobs=None, index=None):
+        """``index`` is a ``SearchIndex`` built over ``jobs`` (the jobs table); both
+        default to one built here over the job rows of ``dataframe``."""
+        if jobs is None:
+            jobs = job_rows(dataframe)
+        if index is None:
+            index = SearchIndex.build(jobs)
+        # One row per index document, so document ids are row positions
+        self.jobs = index.documents(jobs).reset_index(drop=True)
+        self.index = index
+        self.total_rows = len(dataframe)
+        self.digest = compute_digest(dataframe)
+
+        # Vacancies per OPEC across all its cities, for the job lines
+        if {"opec", "ciudad", "vacantes_count"} <= set(dataframe.columns):
+            labels = (
+                dataframe["ciudad"].astype(str) + " ("
+                + dataframe["vacantes_count"].astype(int).astype(str) + ")"
+            )
+            self.cities_by_opec = labels.groupby(dataframe["opec"].to_numpy()).agg(", ".join).to_dict()
+        else:
+            self.cities_by_opec = {}
+
+    def build(self, question, dataframe, token_budget=DEFAULT_TOKEN_BUDGET):
+        """Prompt context for ``question`` restricted to the filtered ``dataframe``"""
+        # The full-dataset digest is reused when no filter is active
+        digest = self.digest if len(dataframe) == self.total_rows else compute_digest(dataframe)
+        sections = [self._summary_section(digest)]
+
+        cities = digest["por_ciudad"]
+        mentioned = [c for c in find_cities(question) if c in cities.index]
+        if mentioned:
+            sections.append(self._city_section("Ciudades mencionadas en la pregunta", cities.loc[mentioned]))
+
+        # Only jobs left by the filters, and in the mentioned cities if any
+        allowed = None
+        if "opec" in self.jobs.columns:
+            scope = dataframe
+            if mentioned:
+                scope = dataframe[dataframe["ciudad"].isin(mentioned)]
+            if len(scope) != self.total_rows:
+                allowed = self.jobs["opec"].isin(scope["opec"].unique()).to_numpy()
+        top_ids = self.index.top(question, k=15, allowed=allowed)
+        matched = self.jobs.iloc[top_ids]
+
+        by_cargo = digest["por_cargo"]
+        if not matched.empty and not by_cargo.empty:
+            relevant = [c for c in dict.fromkeys(matched["cargo"]) if c in by_cargo.index]
+            sections.append(self._salary_section("Salario por cargo (cargos relacionados con la pregunta)", by_cargo.loc[relevant]))
+        if not matched.empty:
+            sections.append(self._jobs_section(matched))
+
+        # Broad context, only if there is budget left
+        if not by_cargo.empty:
+            sections.append(self._salary_section("Cargos mejor pagados", by_cargo.sort_values("max", ascending=False).head(10)))
+        sections.append(self._salary_section("Salario por categoría", digest["por_categoria"]))
+        sections.append(self._salary_section("Salario por convocatoria", digest["por_convocatoria"]))
+        sections.append(self._city_section("Ciudades con más vacantes", cities.head(15)))
+        sections.append(self._salary_section("Cargos con más empleos", by_cargo.head(15)))
+
+        return self._fit(sections, token_budget)
+
+    @staticmethod
+    def _fit(sections, token_budget):
+        # Sections are ordered by relevance: take whole lines until the budget runs out
+        lines = []
+        used = 0
+        for title, body in sections:
+            if not body:
+                continue
+            cost = estimate_tokens(title)
+            if used + cost + estimate_tokens(body[0]) > token_budget:
+                continue
+            lines.append(title)
+            used += cost
+            for line in body:
+                cost = estimate_tokens(line)
+                if used + cost > token_budget:
+                    break
+                lines.append(line)
+                used += cost
+        return "\n".join(lines)
+
+    @staticmethod
+    def _summary_section(digest):
+        return ("Datos de empleos DIAN (con los filtros actuales):", [
+            f"- Empleos (OPEC): {digest['empleos']}",
+            f"- Vacantes: {digest['vacantes']}",
+            f"- Ciudades: {digest['ciudades']}",
+            f"- Salario: mínimo {money(digest['salario_min'])}, mediana {money(digest['salario_mediana'])}, máximo {money(digest['salario_max'])}",
+        ])
+
+    @staticmethod
+    def _city_section(title, table):
+        return (f"{title}:", [
+            f"- {city}: {int(row['vacantes'])} vacantes, {int(row['empleos'])} empleos, salario mediano {money(row['mediana'])}"
+            for city, row in table.iterrows()
+        ])
+
+    @staticmethod
+    def _salary_section(title, table):
+        if table.empty:
+            return (title, [])
+        lines = []
+        for name, row in table.iterrows():
+            if row["min"] == row["max"]:
+                salary = f"salario {money(row['min'])}"
+            else:
+                salary = (
+                    f"salario min {money(row['min'])} / p25 {money(row['p25'])} / "
+                    f"mediana {money(row['mediana'])} / p75 {money(row['p75'])} / max {money(row['max'])}"
+                )
+            lines.append(f"- {name}: {int(row['empleos'])} empleos, {salary}")
+        return (f"{title}:", lines)
+
+    def _jobs_section(self, matched):
+        lines = []
+        for _, job in matched.iterrows():
+            parts = [f"OPEC {job['opec']}" if "opec" in job else None, str(job.get("cargo", ""))]
+            if "salario" in job:
+                parts.append(money(job["salario"]))
+            cities = self.cities_by_opec.get(job.get("opec"))
+            if cities:
+                parts.append(f"ciudades: {cities}")
+            if isinstance(job.get("estudio"), str):
+                parts.append(f"estudio: {' '.join(job['estudio'].split())[:200]}")
+            lines.append("- " + " | ".join(p for p in parts if p))
+        return ("Empleos más relacionados con la pregunta:", lines)
@@ -0,0 +1,94 @@
+"""Background execution of slow Gemini calls, shared by every session.
+
+Jobs run on a small thread pool and are keyed by what they compute (e.g. the
+summary for one dataset version and filter state). Submitting a key that is
+already running or finished returns the existing job instead of calling
+Gemini again, so concurrent users with the same filters share one request.
+Finished jobs are kept (least recently used first out) so a result survives
+reruns and is served to any session asking for the same key.
+
+Jobs must not call Streamlit: they run outside the script thread. The page
+polls ``get(key)`` and renders the result once it is done.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = "pendiente"
+DONE = "listo"
+FAILED = "error"
+
+
+class AIJob:
+    def __init__(self, key):
+        self.key = key
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.submitted
+
+
+class AIJobQueue:
+    """Bounded pool of background AI jobs with coalescing by key"""
+
+    def __init__(self, max_workers=3, max_pending=12, max_results=64):
+        self.max_pending = max_pending
+        self.max_results = max_results
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pending_count(self):
+        with self._lock:
+            return sum(job.status == PENDING for job in self._jobs.values())
+
+    def get(self, key):
+        """The job for ``key``, or None if it was never submitted (or was evicted)"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+            return job
+
+    def submit(self, key, func, *args):
+        """Run ``func(*args)`` in the background unless ``key`` is already running or done.
+
+        A failed job is retried. Returns the job, or None when the queue is
+        full and the caller should ask the user to try again later.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status != FAILED:
+                self._jobs.move_to_end(key)
+                return job
+            if sum(j.status == PENDING for j in self._jobs.values()) >= self.max_pending:
+                return None
+            job = AIJob(key)
+            self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            self._evict()
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        try:
+            job.result = func(*args)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            print(f"AI job {job.key!r} failed: {e}")
+        finally:
+            job.finished = time.time()
+
+    def _evict(self):
+        # Oldest finished jobs go first; running jobs are never dropped
+        excess = len(self._jobs) - self.max_results
+        for key in [k for k, j in self._jobs.items() if j.status != PENDING][:max(excess, 0)]:
+            del self._jobs[key]
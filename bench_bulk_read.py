@@ -0,0 +1,101 @@
+"""Benchmark the CSV bulk read against the JSON rows path on the local stub.
+
+    python bench_bulk_read.py --rows 20000
+
+Serves ``--rows`` synthetic rows from the PostgREST stand-in of loadtest_stub.py
+and reads the whole table both ways, each read in a forked child so its peak
+RSS is its own (pyarrow allocates outside ``tracemalloc``):
+
+- json: ``select("*").execute()`` and ``pd.DataFrame(response.data)``, the
+  path used before ``bulk_read``;
+- csv: ``bulk_read.read_table``, CSV parsed with the ``CSV_ENGINE`` reader.
+
+Also checks that both give the same values; the CSV frame holds them all as
+text, for ``process_dataframe`` to convert.
+"""
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+
+import pandas as pd
+from supabase import create_client
+
+from bulk_read import CSV_ENGINE, read_table
+from loadtest_stub import FAKE_KEY, TABLE, StubServer
+
+
+def read_json(client):
+    return pd.DataFrame(client.table(TABLE).select("*").execute().data)
+
+
+def read_csv(client):
+    frame, wire_format = read_table(client, TABLE)
+    assert wire_format == "csv", wire_format
+    return frame
+
+
+READERS = {"json": read_json, "csv": read_csv}
+
+
+def _measure(url, reader, queue):
+    client = create_client(url, FAKE_KEY)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    frame = READERS[reader](client)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (peak - before) * 1024, len(frame)))
+
+
+def measure(url, reader):
+    """``(seconds, peak RSS growth in bytes, rows)`` of one read in a fresh child process"""
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    child = context.Process(target=_measure, args=(url, reader, queue))
+    child.start()
+    result = queue.get(timeout=300)
+    child.join()
+    return result
+
+
+def same_frame(stub):
+    client = create_client(stub.url, FAKE_KEY)
+    a, b = read_json(client), read_csv(client)
+    if list(a.columns) != list(b.columns) or len(a) != len(b):
+        return False
+    return all(((a[c].astype(str) == b[c].astype(str)) | (a[c].isna() & b[c].isna())).all() for c in a.columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    stub = StubServer(n_rows=args.rows, gemini_delay=0).start()
+    try:
+        same = same_frame(stub)
+        print(f"{args.rows} rows; CSV parsed with the '{CSV_ENGINE}' engine; same values both ways: {same}")
+        results = {}
+        for reader in READERS:
+            runs = [measure(stub.url, reader) for _ in range(args.repeat)]
+            results[reader] = {
+                "ms (mediana)": statistics.median(r[0] for r in runs) * 1000,
+                "pico RSS MiB": max(r[1] for r in runs) / 2**20,
+                "filas": runs[0][2],
+            }
+    finally:
+        stub.stop()
+
+    table = pd.DataFrame(results).T
+    print(table.round(1).to_string())
+    speedup = results["json"]["ms (mediana)"] / results["csv"]["ms (mediana)"]
+    print(f"\nCSV: {speedup:.1f}x más rápido, {results['csv']['pico RSS MiB'] / max(results['json']['pico RSS MiB'], 1e-9):.0%} del pico de memoria de JSON")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark loading several export files: readers, threads and processes.
+
+    python bench_loader.py --files 6 --rows 5000
+
+Writes ``--files`` synthetic exports of ``--rows`` rows each (the bundled
+EmpleosDIAN_2025.xlsx repeated, one year per file) to a temporary directory
+and loads them with ``dataset_loader.load_partitions`` in several ways:
+
+- openpyxl, one file at a time: the loader before partitions were parallel;
+- openpyxl in a spawned process pool: the previous parallel loader, pool
+  start-up included;
+- openpyxl and calamine in the loader's thread pool, with one worker and with
+  one per core.
+
+Also checks that every way gives the same frame.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import dataset_loader
+import snapshot
+from dataset_loader import LEGACY_FILE, discover_partitions, load_partitions, parse_export
+
+
+def write_exports(directory, files, rows):
+    base = pd.read_excel(LEGACY_FILE, engine="openpyxl")
+    frame = pd.concat([base] * (rows // len(base) + 1), ignore_index=True).iloc[:rows]
+    for i in range(files):
+        frame.to_excel(os.path.join(directory, f"EmpleosDIAN_{2010 + i}.xlsx"), index=False)
+
+
+def _parse_with_openpyxl(partition):
+    dataset_loader.EXCEL_ENGINE = "openpyxl"
+    return parse_export(partition)
+
+
+def load_in_processes(partitions):
+    """The spawned process pool the loader used before its thread pool"""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(len(partitions), os.cpu_count() or 1), mp_context=context) as pool:
+        results = list(pool.map(_parse_with_openpyxl, partitions))
+    return pd.concat([frame for frame, _ in results], ignore_index=True)
+
+
+def load_in_threads(partitions, engine, workers):
+    dataset_loader.EXCEL_ENGINE = engine
+    return load_partitions(partitions, max_workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=6)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    variants = {
+        "openpyxl, secuencial": lambda p: load_in_threads(p, "openpyxl", 1),
+        "openpyxl, procesos (spawn)": load_in_processes,
+        f"openpyxl, {cores} hilos": lambda p: load_in_threads(p, "openpyxl", cores),
+        "calamine, secuencial": lambda p: load_in_threads(p, "calamine", 1),
+        f"calamine, {cores} hilos": lambda p: load_in_threads(p, "calamine", cores),
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Keep the loader's manifest out of the app's .cache
+        snapshot.SNAPSHOT_DIR = directory
+        write_exports(directory, args.files, args.rows)
+        partitions = [p for p in discover_partitions(directory) if p.path != LEGACY_FILE]
+
+        results, frames = {}, {}
+        for name, load in variants.items():
+            times = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                frames[name] = load(partitions)
+                times.append(time.perf_counter() - started)
+            results[name] = {"ms (mediana)": statistics.median(times) * 1000, "filas": len(frames[name])}
+
+    reference = frames["openpyxl, secuencial"]
+    same = all(frame.equals(reference) for frame in frames.values())
+    baseline = results["openpyxl, secuencial"]["ms (mediana)"]
+    for row in results.values():
+        row["aceleración"] = baseline / row["ms (mediana)"]
+    print(f"\n{args.files} archivos x {args.rows} filas, {cores} núcleos; mismo resultado en todas: {same}")
+    print(pd.DataFrame(results).T.round(2).to_string())
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
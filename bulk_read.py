@@ -0,0 +1,79 @@
+"""Whole-table reads from Supabase as CSV instead of JSON row dicts.
+
+``select("*").execute()`` decodes the JSON body into one Python dict per row
+and pandas then rebuilds columns from those dicts: for a large table that
+dominates the load and holds the data twice at its peak. PostgREST can answer
+the same query as CSV (``Accept: text/csv``), which is parsed straight into
+columns, with pyarrow's CSV reader when it is installed and pandas' C parser
+otherwise.
+
+CSV carries no types, and inferring them would turn text such as OPEC codes
+'0123' into numbers, so every column is read as text. The caller converts the
+numeric columns it uses (see ``process_dataframe`` in streamlit_app.py);
+unlike ``pd.DataFrame(json_rows)``, the frame holds no int or float columns.
+
+PostgREST has no Arrow output, so CSV is the columnar format used. Backends or
+proxies that do not serve CSV fall back to the JSON path; network errors and
+timeouts do not, since a second request to a source that is not answering
+would only double the wait.
+"""
+import csv
+import importlib.util
+import io
+from urllib.parse import quote
+
+import httpx
+import pandas as pd
+
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
+
+def parse_csv(content):
+    """CSV bytes to a DataFrame of text columns; NULLs (empty unquoted fields) are missing values"""
+    if CSV_ENGINE == "pyarrow":
+        import pyarrow as pa
+        from pyarrow import csv as arrow_csv
+        header = next(csv.reader([content.split(b"\n", 1)[0].decode("utf-8")]))
+        # Descriptions span several lines. PostgREST writes NULL as an empty
+        # field and '' as "", so only unquoted empty fields are nulls
+        table = arrow_csv.read_csv(
+            io.BytesIO(content),
+            parse_options=arrow_csv.ParseOptions(newlines_in_values=True),
+            convert_options=arrow_csv.ConvertOptions(
+                column_types={name: pa.string() for name in header},
+                null_values=[""],
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+        return table.to_pandas()
+    # The C parser cannot tell "" from an empty field: both come back missing
+    return pd.read_csv(io.BytesIO(content), dtype=str, keep_default_na=False, na_values=[""])
+
+
+def read_csv_table(session, table, columns="*"):
+    """``table`` through a PostgREST ``session`` (an ``httpx.Client``) as CSV, parsed into a DataFrame"""
+    response = session.get(quote(table), params={"select": columns}, headers={"Accept": "text/csv"})
+    response.raise_for_status()
+    content_type = response.headers.get("content-type", "")
+    if not content_type.startswith("text/csv"):
+        raise ValueError(f"expected CSV, got '{content_type}'")
+    if not response.content.strip():
+        return pd.DataFrame()
+    return parse_csv(response.content)
+
+
+def read_table(client, table, columns="*"):
+    """``(DataFrame, wire format)`` for the whole ``table`` from a Supabase ``client``.
+
+    Tries CSV first and falls back to the JSON rows of ``select().execute()``
+    when the backend cannot produce CSV.
+    """
+    try:
+        return read_csv_table(client.postgrest.session, table, columns), "csv"
+    except httpx.TransportError:
+        raise
+    except Exception as e:
+        print(f"CSV read of '{table}' unavailable ({str(e).splitlines()[0]}), using JSON")
+    response = client.table(table).select(columns).execute()
+    return pd.DataFrame(response.data), "json"
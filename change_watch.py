@@ -0,0 +1,226 @@
+"""Push-based change detection for the dataset sources.
+
+Instead of re-reading the data on a fixed timer, the dashboard reloads when a
+source reports a change:
+
+- Supabase: a Realtime ``postgres_changes`` subscription on the jobs table
+  (Postgres logical replication, the hosted counterpart of LISTEN/NOTIFY).
+  The table has to be in the ``supabase_realtime`` publication.
+- Local export files: mtime and size are checked every few seconds and a file
+  is re-hashed only when they change, so touching a file or saving identical
+  contents does not trigger a reload.
+
+Notifications go through a ``ChangeFeed`` that debounces them: an upload
+inserts rows in batches, which arrive as a burst of events and must cause one
+reload, not hundreds.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+
+class ChangeFeed:
+    """Debounced fan-out of "source changed" notifications to subscribers"""
+
+    def __init__(self, quiet_period=5.0):
+        self.quiet_period = quiet_period
+        self.watchers = {}
+        self.events = {}
+        self.last_change = {}
+        self._subscribers = []
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Call ``callback(source)`` once per burst of changes"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def add_watcher(self, source, watcher):
+        self.watchers[source] = watcher
+        watcher.start()
+        return watcher
+
+    def live(self, source):
+        """Whether changes to ``source`` are currently being pushed"""
+        watcher = self.watchers.get(source)
+        return watcher is not None and watcher.live
+
+    def notify(self, source):
+        """Record a change; subscribers hear about it after ``quiet_period`` without new ones"""
+        with self._lock:
+            self.events[source] = self.events.get(source, 0) + 1
+            timer = self._timers.get(source)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.quiet_period, self._deliver, [source])
+            timer.daemon = True
+            self._timers[source] = timer
+        timer.start()
+
+    def _deliver(self, source):
+        with self._lock:
+            self._timers.pop(source, None)
+            self.last_change[source] = time.time()
+        print(f"Change feed: '{source}' changed, notifying {len(self._subscribers)} subscribers")
+        for callback in list(self._subscribers):
+            try:
+                callback(source)
+            except Exception as e:
+                print(f"Change feed subscriber failed: {e}")
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.md5()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileWatcher:
+    """Polls ``list_files()`` and reports added, removed or rewritten files"""
+
+    def __init__(self, list_files, on_change, interval=5.0, source="local"):
+        self.list_files = list_files
+        self.on_change = on_change
+        self.interval = interval
+        self.source = source
+        self.live = False
+        self._state = {}
+        self._stop = threading.Event()
+
+    def _scan(self):
+        state = {}
+        for path in self.list_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            known = self._state.get(path)
+            # Only hash files whose mtime or size moved
+            state[path] = known if known and known[0] == signature else (signature, file_hash(path))
+        return state
+
+    def check(self):
+        """Poll once; True (and ``on_change`` called) if any file's content changed"""
+        state = self._scan()
+        changed = {p: h for p, (_, h) in state.items()} != {p: h for p, (_, h) in self._state.items()}
+        self._state = state
+        if changed:
+            self.on_change(self.source)
+        return changed
+
+    def start(self):
+        self._state = self._scan()
+        self.live = True
+        threading.Thread(target=self._run, name="file-watcher", daemon=True).start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"File watcher error: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self.live = False
+
+
+def _socket_open(client):
+    # AsyncRealtimeClient.is_connected stays True after the server closes the
+    # socket cleanly, so look at the websocket itself
+    from websockets.protocol import State
+
+    connection = getattr(client, "_ws_connection", None)
+    return connection is not None and connection.state is State.OPEN
+
+
+class RealtimeWatcher:
+    """Supabase Realtime subscription to every change on one table.
+
+    Runs its own asyncio loop in a daemon thread and reconnects with
+    exponential backoff (up to ``max_backoff`` seconds) when the socket or
+    the channel drops; ``live`` is True only while subscribed.
+    """
+
+    def __init__(self, realtime_url, key, table, on_change, schema="public", source="supabase", max_backoff=300):
+        self.realtime_url = realtime_url
+        self.key = key
+        self.table = table
+        self.schema = schema
+        self.on_change = on_change
+        self.source = source
+        self.max_backoff = max_backoff
+        self.live = False
+        self.subscribed_at = None
+        self.last_error = None
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=lambda: asyncio.run(self._main()), name="realtime-watcher", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    async def _main(self):
+        backoff = 1
+        while not self._stop.is_set():
+            attempt = time.time()
+            try:
+                await self._listen()
+            except Exception as e:
+                if self.subscribed_at and self.subscribed_at >= attempt:
+                    # It was working: start the backoff over
+                    backoff = 1
+                self.last_error = str(e)
+                print(f"Realtime watcher: {e}; retrying in {backoff} s")
+            self.live = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _listen(self):
+        from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+
+        client = AsyncRealtimeClient(self.realtime_url, token=self.key, auto_reconnect=False)
+        joined = asyncio.Event()
+        failure = []
+
+        def on_state(state, error):
+            if state == RealtimeSubscribeStates.SUBSCRIBED:
+                joined.set()
+            else:
+                failure.append(error or state)
+                joined.set()
+
+        try:
+            await client.connect()
+            channel = client.channel(f"dashboard:{self.table}")
+            channel.on_postgres_changes(
+                "*", table=self.table, schema=self.schema, callback=lambda payload: self.on_change(self.source)
+            )
+            await channel.subscribe(on_state)
+            await asyncio.wait_for(joined.wait(), timeout=15)
+            if failure:
+                raise RuntimeError(f"subscription to {self.table} failed: {failure[0]}")
+
+            self.live = True
+            self.subscribed_at = time.time()
+            self.last_error = None
+            print(f"Realtime watcher: listening for changes on '{self.table}'")
+            while not self._stop.is_set() and _socket_open(client) and channel.is_joined:
+                await asyncio.sleep(1)
+            if not self._stop.is_set():
+                raise RuntimeError("connection lost")
+        finally:
+            self.live = False
+            await client.close()
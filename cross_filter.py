@@ -0,0 +1,259 @@
+"""Cross-filter controller for map clicks, bar clicks and sidebar widgets.
+
+Every filter input writes its new value from a widget callback. Streamlit runs
+callbacks *before* the next script run, so the script reads the final filter
+state at the top of the run and never needs a second ``st.rerun()`` pass: each
+interaction costs exactly one run. Runs are counted per interaction so that
+any regression back to double reruns shows up in the diagnostics panel.
+
+Sections that depend only on data computed by the last full run are wrapped
+with ``tracked_fragment`` so their own widgets rerun just that fragment; the
+history records whether an interaction ran the whole app or a single fragment.
+
+Runs are also the unit of the opt-in memory profiler (``memory_profile``):
+each one is profiled from ``begin_run`` to ``end_run``.
+"""
+import functools
+import time
+from collections import deque
+
+import streamlit as st
+
+import memory_profile
+from filter_engine import empty_filter_state
+
+# Filter state key -> sidebar widget key
+WIDGET_KEYS = {
+    "ciudades": "city_filter_widget",
+    "categorias": "category_filter_widget",
+    "convocatorias": "convocatoria_filter_widget",
+    "procesos": "proceso_filter_widget",
+    "estudios": "estudio_filter_widget",
+    "salario": "salary_filter_widget",
+    "busqueda": "search_filter_widget",
+}
+
+# Filter state key -> URL query parameter, so a link reproduces the filters
+QUERY_PARAMS = {
+    "ciudades": "ciudad",
+    "categorias": "categoria",
+    "convocatorias": "convocatoria",
+    "procesos": "ficha",
+    "estudios": "estudio",
+    "salario": "salario",
+    "busqueda": "q",
+}
+
+HISTORY_SIZE = 50
+MEMORY_HISTORY_SIZE = 20
+
+
+def _selected_points(chart_key):
+    selection = st.session_state.get(chart_key)
+    if selection and "selection" in selection and "points" in selection["selection"]:
+        return selection["selection"]["points"]
+    return []
+
+
+def start_interaction(source):
+    """Open a new interaction; called from widget callbacks"""
+    previous = st.session_state.get("xf_current")
+    st.session_state.xf_current = {
+        "id": previous["id"] + 1 if previous else 1,
+        "source": source,
+        "scope": None,
+        "runs": 0,
+        "ms": None,
+        "started": time.perf_counter(),
+        "closed": False,
+    }
+
+
+def on_map_select():
+    """Map click: filter the dashboard to the clicked city"""
+    start_interaction("mapa")
+    points = _selected_points("map_selection")
+    # Clearing the map selection keeps the current city filter
+    if points:
+        st.session_state[WIDGET_KEYS["ciudades"]] = [points[0]["hovertext"]]
+
+
+def on_bar_select():
+    """Bar click: restrict the detail table to the clicked cargo"""
+    start_interaction("barras")
+    points = _selected_points("bar_selection")
+    st.session_state.bar_selection_cargo = points[0]["x"] if points else None
+
+
+def on_sidebar_change():
+    start_interaction("filtros")
+
+
+def request_rerun():
+    """``st.rerun()`` that counts the extra run against the current interaction"""
+    st.session_state.xf_continue = True
+    st.rerun()
+
+
+def begin_run(scope="app"):
+    """Count this run (whole app or one fragment) against its interaction"""
+    if scope == "app":
+        st.session_state.xf_app_run_open = True
+    current = st.session_state.get("xf_current")
+    continued = st.session_state.pop("xf_continue", False)
+    if current is None:
+        start_interaction("carga inicial")
+    elif current["closed"] and not continued:
+        # Run triggered by an input without a callback (chat box, buttons, ...)
+        start_interaction("otro")
+    current = st.session_state.xf_current
+    current["runs"] += 1
+    current["scope"] = scope
+    current["closed"] = False
+    memory_profile.start(scope)
+
+
+def end_run():
+    """Close the current run and record it in the interaction history"""
+    st.session_state.xf_app_run_open = False
+    profile = memory_profile.finish()
+    if profile is not None:
+        if "xf_memory" not in st.session_state:
+            st.session_state.xf_memory = deque(maxlen=MEMORY_HISTORY_SIZE)
+        st.session_state.xf_memory.append(profile)
+    current = st.session_state.get("xf_current")
+    if current is None:
+        return
+    current["ms"] = (time.perf_counter() - current["started"]) * 1000
+    current["closed"] = True
+    if "xf_history" not in st.session_state:
+        st.session_state.xf_history = deque(maxlen=HISTORY_SIZE)
+    history = st.session_state.xf_history
+    if not history or history[-1]["id"] != current["id"]:
+        history.append(current)
+
+
+def tracked_fragment(name):
+    """``st.fragment`` that records its standalone reruns in the history.
+
+    When the fragment runs as part of a full app run it is already covered by
+    the app-level begin_run/end_run pair and is not counted again.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def run_fragment(*args, **kwargs):
+            standalone = not st.session_state.get("xf_app_run_open", False)
+            if standalone:
+                begin_run(scope=name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if standalone:
+                    end_run()
+        return st.fragment(run_fragment)
+    return decorate
+
+
+def _restore_query_params(min_salary, max_salary):
+    """On a session's first run, load the filters of a shared link into the widgets"""
+    if st.session_state.get("xf_query_restored"):
+        return
+    st.session_state.xf_query_restored = True
+    for key, param in QUERY_PARAMS.items():
+        values = st.query_params.get_all(param)
+        if not values:
+            continue
+        widget_key = WIDGET_KEYS[key]
+        if key == "salario":
+            try:
+                lo, hi = sorted(int(v) for v in values[0].split("-", 1))
+            except ValueError:
+                continue
+            st.session_state[widget_key] = (max(lo, min_salary), min(hi, max_salary))
+        elif key == "busqueda":
+            st.session_state[widget_key] = values[0]
+        else:
+            # Values that are not options are dropped by cascade_options before use
+            st.session_state[widget_key] = values
+
+
+def mirror_query_params(state, min_salary, max_salary):
+    """Write ``state`` to the URL query parameters; only filters that are set appear"""
+    for key, param in QUERY_PARAMS.items():
+        value = state.get(key)
+        if key == "salario":
+            lo, hi = value
+            value = [f"{int(lo)}-{int(hi)}"] if (lo, hi) != (min_salary, max_salary) else []
+        elif key == "busqueda":
+            value = [value] if value else []
+        else:
+            value = sorted(map(str, value or []))
+        if value == st.query_params.get_all(param):
+            continue
+        if value:
+            st.query_params[param] = value
+        else:
+            del st.query_params[param]
+
+
+def resolve_filter_state(min_salary, max_salary):
+    """Filter state for this run as the widgets hold it, read before any widget is drawn.
+
+    On the first run of a session the filters come from the URL query
+    parameters (see ``mirror_query_params``), so a shared link opens on the
+    same filters. Selections may no longer be options of their widget: check
+    them with ``filter_engine.cascade_options`` and hand the result to
+    ``sync_widgets`` before computing anything.
+    """
+    _restore_query_params(min_salary, max_salary)
+    state = empty_filter_state(min_salary, max_salary)
+    for key, widget_key in WIDGET_KEYS.items():
+        value = st.session_state.get(widget_key)
+        if value:
+            if key == "salario":
+                # The range kept from another dataset may not fit this one
+                lo, hi = max(value[0], min_salary), min(value[1], max_salary)
+                state[key] = (lo, hi) if lo <= hi else (min_salary, max_salary)
+            elif key == "busqueda":
+                state[key] = value.strip()
+            else:
+                state[key] = list(value)
+    state["cargo"] = st.session_state.get("bar_selection_cargo")
+    return state
+
+
+def sync_widgets(state):
+    """Make the sidebar widgets show ``state``, e.g. once stale selections are dropped.
+
+    Must be called before the widgets are drawn. Widgets that already show
+    their value are left alone.
+    """
+    for key, widget_key in WIDGET_KEYS.items():
+        if key == "busqueda":
+            continue
+        current = st.session_state.get(widget_key)
+        if key == "salario":
+            if current is not None and tuple(current) != tuple(state[key]):
+                st.session_state[widget_key] = tuple(state[key])
+        elif list(current or []) != list(state[key]):
+            st.session_state[widget_key] = list(state[key])
+
+
+def memory_history():
+    """Per-stage memory of this session's last profiled run, or [] when profiling is off"""
+    runs = st.session_state.get("xf_memory")
+    return runs[-1]["etapas"] if runs else []
+
+
+def rerun_history():
+    """Rows for the diagnostics table, newest first"""
+    return [
+        {
+            "Interacción": item["id"],
+            "Origen": item["source"],
+            "Alcance": "app completa" if item["scope"] == "app" else f"fragmento: {item['scope']}",
+            "Ejecuciones": item["runs"],
+            "Tiempo (ms)": round(item["ms"] or 0, 1),
+        }
+        for item in reversed(st.session_state.get("xf_history", []))
+    ]
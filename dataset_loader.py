@@ -0,0 +1,159 @@
+"""Partitioned loading of OPEC export files.
+
+Every export in the data directory (plus the bundled EmpleosDIAN_2025.xlsx) is
+a partition tagged with its year, taken from the file name. Partitions outside
+the selected years are skipped without being opened, and so are files that a
+previous load found to have no matching convocatoria (the convocatorias of
+each file are kept in a small manifest under ``.cache/``, keyed by file size
+and mtime). The remaining files are parsed in a thread pool and concatenated
+in a stable order.
+
+Threads rather than processes: the loader runs inside Streamlit's threaded
+server, where forked workers can inherit locks held by other threads, and
+spawned ones pay for a fresh interpreter and pandas import on every load and
+re-run ``__main__``, which Streamlit points at the page script. Excel files
+are read with calamine (Rust) when python-calamine is installed, openpyxl
+otherwise; bench_loader.py compares the options.
+"""
+import importlib.util
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from snapshot import load_snapshot, save_snapshot
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get("EMPLEOS_DATA_DIR", os.path.join(BASE_DIR, "data", "exports"))
+LEGACY_FILE = os.path.join(BASE_DIR, "EmpleosDIAN_2025.xlsx")
+EXPORT_EXTENSIONS = (".xlsx", ".xls", ".csv")
+MANIFEST_VERSION = "v1"
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+
+Partition = namedtuple("Partition", ["path", "anio", "size", "mtime"])
+
+# Output column -> (keywords, excluded keywords) matched against the export headers
+HEADER_KEYWORDS = {
+    "cargo": (["denominac", "cargo"], None),
+    "salario": (["asignaci", "salarial", "sueldo"], None),
+    # Exclude 'cantidad' to avoid picking 'Cantidad de Vacantes'
+    "ciudad_raw": (["vacantes", "ubicacion", "ciudad"], ["cantidad"]),
+    "categoria": (["categoria", "categor"], None),
+    "convocatoria": (["convocatoria"], None),
+    "descripcion": (["descripci"], None),
+    "estudio": (["estudio"], None),
+    "experiencia": (["experiencia"], None),
+    "opec": (["opec"], None),
+    "grado": (["grado"], None),
+    "codigo_empleo": (["código empleo", "codigo empleo"], None),
+}
+
+
+def resolve_headers(columns):
+    """Map each output column to the first export header matching its keywords"""
+    resolved = {}
+    for target, (keywords, exclude) in HEADER_KEYWORDS.items():
+        for col in columns:
+            name = str(col).lower()
+            if any(k in name for k in keywords):
+                if exclude and any(e in name for e in exclude):
+                    continue
+                resolved[target] = col
+                break
+    return resolved
+
+
+def discover_partitions(directory=DATA_DIR):
+    """Export files in ``directory`` plus the bundled file, sorted by year then name"""
+    paths = []
+    if os.path.isdir(directory):
+        paths = [
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(EXPORT_EXTENSIONS) and not name.startswith("~$")
+        ]
+    if os.path.exists(LEGACY_FILE) and os.path.basename(LEGACY_FILE) not in {os.path.basename(p) for p in paths}:
+        paths.append(LEGACY_FILE)
+
+    partitions = []
+    for path in paths:
+        stat = os.stat(path)
+        match = re.search(r"(?<!\d)(20\d{2})(?!\d)", os.path.basename(path))
+        anio = int(match.group(1)) if match else pd.Timestamp(stat.st_mtime, unit="s").year
+        partitions.append(Partition(path, anio, stat.st_size, stat.st_mtime))
+    return sorted(partitions, key=lambda p: (p.anio, os.path.basename(p.path)))
+
+
+def parse_export(partition, convocatoria_keyword=None):
+    """Read one export into the loader's column names (runs in a worker thread).
+
+    Returns ``(frame, convocatorias present in the file)``; the frame only keeps
+    rows whose convocatoria contains ``convocatoria_keyword`` when one is given.
+    """
+    if partition.path.lower().endswith(".csv"):
+        raw = pd.read_csv(partition.path)
+    else:
+        raw = pd.read_excel(partition.path, engine=EXCEL_ENGINE)
+
+    headers = resolve_headers(raw.columns)
+    frame = pd.DataFrame({target: raw[col] for target, col in headers.items()})
+
+    convocatorias = []
+    if "convocatoria" in frame.columns:
+        frame = frame.dropna(subset=["convocatoria"])
+        convocatorias = sorted(frame["convocatoria"].astype(str).unique())
+        if convocatoria_keyword:
+            frame = frame[frame["convocatoria"].astype(str).str.contains(convocatoria_keyword, case=False, na=False)]
+
+    frame["anio"] = partition.anio
+    frame["archivo"] = os.path.basename(partition.path)
+    return frame, convocatorias
+
+
+def _manifest_key(partition):
+    return f"{partition.path}:{partition.size}:{partition.mtime}"
+
+
+def prune_partitions(partitions, years=None, convocatoria_keyword=None, manifest=None):
+    """Partitions that can contain rows for ``years`` and ``convocatoria_keyword``"""
+    manifest = manifest or {}
+    kept = []
+    for partition in partitions:
+        if years and partition.anio not in years:
+            continue
+        known = manifest.get(_manifest_key(partition))
+        # Files without a convocatoria column are never pruned by it
+        if convocatoria_keyword and known:
+            if not any(convocatoria_keyword.lower() in c.lower() for c in known):
+                continue
+        kept.append(partition)
+    return kept
+
+
+def load_partitions(partitions, years=None, convocatoria_keyword=None, max_workers=None):
+    """Parse the partitions that survive pruning and concatenate them"""
+    manifest = load_snapshot("dataset_manifest", MANIFEST_VERSION) or {}
+    selected = prune_partitions(partitions, years, convocatoria_keyword, manifest)
+    print(f"Dataset loader: {len(selected)} of {len(partitions)} partitions to read")
+    if not selected:
+        return pd.DataFrame()
+
+    if len(selected) == 1:
+        # Not worth starting a pool for a single file
+        results = [parse_export(selected[0], convocatoria_keyword)]
+    else:
+        workers = min(len(selected), max_workers or os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dataset-loader") as pool:
+            results = list(pool.map(parse_export, selected, [convocatoria_keyword] * len(selected)))
+
+    updated = dict(manifest)
+    for partition, (_, convocatorias) in zip(selected, results):
+        updated[_manifest_key(partition)] = convocatorias
+    if updated != manifest:
+        save_snapshot("dataset_manifest", MANIFEST_VERSION, updated)
+
+    frames = [frame for frame, _ in results if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
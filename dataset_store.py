@@ -0,0 +1,149 @@
+"""Stale-while-revalidate holder for the loaded dataset.
+
+``DatasetStore.get()`` always answers from memory once the first load is done.
+When the data is older than ``refresh_interval`` a single background thread
+reloads it while readers keep getting the previous version; the new version
+replaces it in one assignment, so a reader sees either the old or the new
+dataset, never a mix. A failed or empty reload keeps the last good data.
+
+With a ``change_feed`` (see change_watch.py) the store also reloads as soon
+as its source reports a change, and the timer becomes a slow safety net
+while that source's changes are being pushed.
+
+Each version carries a ``version`` id derived from its whole content (every
+column, in row order), for keying downstream caches (search index, assistant
+context): a reload that returns the same rows keeps the same id and nothing
+downstream is rebuilt, and any other reload replaces the dataset.
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from jobs_model import JobsDataset
+from snapshot import frame_fingerprint
+
+DatasetVersion = namedtuple("DatasetVersion", ["data", "version", "source", "loaded_at"])
+
+
+def dataset_version(data):
+    """Short content id of a processed ``JobsDataset``"""
+    fingerprint = "|".join(
+        ",".join(map(str, frame.columns)) + ":" + frame_fingerprint(frame, list(frame.columns))
+        for frame in (data.jobs, data.locations)
+    )
+    return hashlib.md5(fingerprint.encode()).hexdigest()[:12]
+
+
+class DatasetStore:
+    """Serves the last good dataset and refreshes it in the background.
+
+    ``loader(previous)`` returns a processed ``JobsDataset`` (``attrs["fuente"]``
+    names where it came from); ``previous`` is the version being replaced, or
+    None on the first load, so the loader can avoid downgrading e.g. from
+    Supabase data to a cold Excel parse.
+    """
+
+    def __init__(self, loader, refresh_interval=600, change_feed=None, watched_refresh_interval=6 * 3600):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.change_feed = change_feed
+        self.watched_refresh_interval = watched_refresh_interval
+        self._current = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._requested = False
+        self.last_error = None
+        self.last_refresh_seconds = None
+        self.closed = False
+        if change_feed is not None:
+            change_feed.subscribe(self.invalidate)
+
+    def get(self):
+        """Current dataset version, loading synchronously only the first time"""
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    self._load(previous=None)
+                current = self._current
+        elif self._requested or time.time() - current.loaded_at > self.current_refresh_interval():
+            self.refresh_in_background()
+        return current
+
+    def current_refresh_interval(self):
+        """Seconds between timed reloads: long while changes are pushed, else ``refresh_interval``"""
+        current = self._current
+        if self.change_feed is not None and current is not None and self.change_feed.live(current.source):
+            return self.watched_refresh_interval
+        return self.refresh_interval
+
+    def invalidate(self, source):
+        """Change notification from ``source``; reloads unless it cannot affect the data served.
+
+        Local file changes do not matter while Supabase data is served. A
+        Supabase change while serving local data does: the source is back.
+        """
+        current = self._current
+        if source == "local" and current is not None and current.source not in (None, "local"):
+            return False
+        self.request_refresh()
+        return True
+
+    def request_refresh(self):
+        """Reload on the next ``get`` (or now, if nobody is waiting for data)"""
+        self._requested = True
+        if self._current is not None:
+            self.refresh_in_background()
+
+    def refresh_in_background(self):
+        """Start a reload thread unless one is already running"""
+        with self._lock:
+            if self._refreshing or self.closed:
+                return False
+            self._refreshing = True
+            self._requested = False
+        threading.Thread(target=self._background_refresh, name="dataset-refresh", daemon=True).start()
+        return True
+
+    def close(self):
+        """Stop following the change feed and reloading; ``get`` keeps serving the last data"""
+        self.closed = True
+        if self.change_feed is not None:
+            self.change_feed.unsubscribe(self.invalidate)
+
+    def _background_refresh(self):
+        try:
+            self._load(previous=self._current)
+        finally:
+            self._refreshing = False
+
+    def _load(self, previous):
+        started = time.perf_counter()
+        try:
+            data = self.loader(previous)
+        except Exception as e:
+            data = None
+            self.last_error = str(e)
+            print(f"Dataset refresh failed: {e}")
+        self.last_refresh_seconds = time.perf_counter() - started
+
+        if data is None or data.empty:
+            if previous is not None:
+                # Keep serving the last good data; try again after another interval
+                print("Dataset refresh returned no data, keeping the previous version")
+                self._current = previous._replace(loaded_at=time.time())
+            elif data is not None:
+                self._current = DatasetVersion(data, "vacio", data.attrs.get("fuente"), time.time())
+            else:
+                self._current = DatasetVersion(JobsDataset.empty_dataset(), "vacio", None, time.time())
+            return
+
+        version = dataset_version(data)
+        if previous is not None and previous.version == version:
+            # Same rows: keep the old dataset so downstream caches stay valid
+            self._current = previous._replace(loaded_at=time.time())
+        else:
+            self._current = DatasetVersion(data, version, data.attrs.get("fuente"), time.time())
+            print(f"Dataset version {version} loaded in {self.last_refresh_seconds:.2f} s")
+        self.last_error = None
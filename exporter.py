@@ -0,0 +1,127 @@
+"""Chunked export of the filtered jobs in CSV, Parquet or Excel.
+
+Rows are joined from the jobs/locations tables by location position (the
+filter mask turned into row numbers) a chunk at a time, renamed to the
+table's display names and written straight to the output file, so the only
+full-size object is the encoded file itself.
+"""
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 5000
+
+# Column names shown in the detail table and in exported files
+DISPLAY_RENAMES = {
+    'vacantes_count': 'Vacantes Ciudad Seleccionada',
+    'cargo': 'Cargo',
+    'salario': 'Salario',
+    'ciudad': 'Ciudad',
+    'categoria': 'Categoría',
+    'convocatoria': 'Convocatoria',
+    'opec': 'OPEC',
+    'estudio': 'Estudio',
+    'experiencia': 'Experiencia',
+    'Cantidad de Vacantes': 'Numero de vacantes del proceso',
+    'cantidad de vacantes': 'Numero de vacantes del proceso',
+    'proceso': 'Ficha',
+    'Proceso': 'Ficha',
+    'descripcion': 'Descripción',
+    'Descripción': 'Descripción',
+    'anio': 'Año'
+}
+
+# Internal columns left out of the table and the exports (compared case-insensitively)
+HIDDEN_COLUMNS = ['latitud', 'longitud', 'codigo_dane', 'ciudad_raw', 'Grado', 'Código Empleo', 'Codigo Empleo', 'codigo_empleo', 'Nivel', 'vacantes_raw', 'estudios_nbc', 'archivo']
+
+# Label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def display_columns(columns):
+    """``(source columns, display names)`` after hiding internal columns and renaming"""
+    hidden = {c.lower() for c in HIDDEN_COLUMNS}
+    renamed = [(col, DISPLAY_RENAMES.get(col, col)) for col in columns]
+    kept = [(col, name) for col, name in renamed if col.lower() not in hidden and name.lower() not in hidden]
+    return [col for col, _ in kept], [name for _, name in kept]
+
+
+def to_display(dataframe):
+    """The detail table's view of ``dataframe``: internal columns dropped, display names"""
+    source, names = display_columns(dataframe.columns)
+    display_df = dataframe[source]
+    display_df.columns = names
+    return display_df
+
+
+def iter_display_chunks(data, positions, chunk_rows=CHUNK_ROWS):
+    """Yield the location rows at ``positions`` of ``data`` (a ``JobsDataset``)
+    in display form, ``chunk_rows`` at a time"""
+    source, names = display_columns(data.columns)
+    for start in range(0, len(positions), chunk_rows):
+        chunk = data.wide(positions[start:start + chunk_rows], source)
+        chunk.columns = names
+        yield chunk
+
+
+def _write_csv(chunks, fh):
+    for i, chunk in enumerate(chunks):
+        # BOM on the first chunk so Excel opens accents correctly
+        fh.write(chunk.to_csv(index=False, header=i == 0).encode("utf-8-sig" if i == 0 else "utf-8"))
+
+
+def _write_parquet(chunks, fh, sample):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Fix the schema up front: a chunk where a column is all null must not
+    # change its type half way through the file
+    schema = pa.Schema.from_pandas(sample, preserve_index=False)
+    schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+    with pq.ParquetWriter(fh, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _write_xlsx(chunks, fh, names):
+    from openpyxl import Workbook
+
+    # Write-only mode streams rows to disk instead of keeping every cell object
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Empleos")
+    sheet.append(names)
+    for chunk in chunks:
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append([None if isinstance(v, float) and np.isnan(v) else v for v in row])
+    workbook.save(fh)
+
+
+def write_export(data, positions, fmt, fh, chunk_rows=CHUNK_ROWS):
+    """Write the location rows at ``positions`` of ``data`` to binary file ``fh`` as ``fmt``"""
+    positions = np.asarray(positions, dtype=np.int64)
+    chunks = iter_display_chunks(data, positions, chunk_rows)
+    if fmt == "CSV":
+        _write_csv(chunks, fh)
+    elif fmt == "Parquet":
+        sample = next(iter_display_chunks(data, np.arange(min(len(data), chunk_rows))), pd.DataFrame())
+        _write_parquet(chunks, fh, sample)
+    elif fmt == "Excel":
+        _write_xlsx(chunks, fh, display_columns(data.columns)[1])
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+def export_file(data, positions, fmt, chunk_rows=CHUNK_ROWS):
+    """Exported file as an open binary file positioned at the start.
+
+    Small exports stay in memory; larger ones spill to a temporary file.
+    """
+    fh = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    write_export(data, positions, fmt, fh, chunk_rows)
+    fh.seek(0)
+    return fh
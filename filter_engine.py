@@ -0,0 +1,158 @@
+"""Filter state and boolean masks for the jobs dashboard.
+
+A filter state is a plain dict so it can live in ``st.session_state`` and be
+compared or hashed cheaply:
+
+    {
+        "ciudades": [...], "categorias": [...], "convocatorias": [...],
+        "procesos": [...], "estudios": [...], "salario": (lo, hi),
+        "busqueda": "", "cargo": None,
+    }
+
+Empty selections mean "no filter", like the sidebar widgets.
+"""
+import numpy as np
+
+from gazetteer import fold_text
+from text_features import nbc_match, nbc_options
+
+# Filter state key -> dataframe column for the plain "isin" filters
+ISIN_FILTERS = {
+    "ciudades": "ciudad",
+    "categorias": "categoria",
+    "convocatorias": "convocatoria",
+    "procesos": "proceso",
+}
+
+# Sidebar filters whose options depend on the selections above them, in order
+CASCADE = {
+    "ciudades": "ciudad",
+    "categorias": "categoria",
+    "convocatorias": "convocatoria",
+    "procesos": "proceso",
+    "estudios": "estudios_nbc",
+}
+
+
+def empty_filter_state(min_salary=0, max_salary=0):
+    """Filter state with nothing selected and the full salary range"""
+    return {
+        "ciudades": [],
+        "categorias": [],
+        "convocatorias": [],
+        "procesos": [],
+        "estudios": [],
+        "salario": (min_salary, max_salary),
+        "busqueda": "",
+        "cargo": None,
+    }
+
+
+def filter_key(state, ignore=()):
+    """Hashable canonical form of ``state``: same filters, same key.
+
+    Selections are sorted and the search text folded, so the order in which
+    options were picked or how the query was typed does not matter.
+    """
+    key = []
+    for name in sorted(state):
+        value = state[name]
+        if name in ignore or value is None or (name != "salario" and not value):
+            continue
+        if name == "salario":
+            value = tuple(int(v) for v in value)
+        elif name == "busqueda":
+            value = " ".join(fold_text(value).split())
+        elif isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(map(str, value)))
+        key.append((name, value))
+    return tuple(key)
+
+
+def cascade_options(data, state, search_scores=None):
+    """Options of each cascading filter and ``state`` without the selections that left them.
+
+    Cities are offered in full; every other filter offers the values left by
+    the search and the selections above it, in ``CASCADE`` order. Returns
+    ``(options, state)`` where ``options[key]`` is a sorted list, or None when
+    the filter has no column or nothing is left to choose from (the sidebar
+    does not draw it), and the returned state keeps only selections that are
+    still options, so a narrowed filter never filters with a hidden value.
+    """
+    state = dict(state)
+    options = {}
+    mask = np.ones(len(data), dtype=bool)
+    if state.get("busqueda") and search_scores is not None:
+        mask &= (search_scores > 0)[data.job_id]
+    for key, column in CASCADE.items():
+        table = data.table_of(column)
+        if table is None or (key != "ciudades" and not mask.any()):
+            options[key] = None
+            state[key] = []
+            continue
+        if key == "ciudades":
+            values = table[column].dropna().unique()
+        elif key == "estudios":
+            values = nbc_options(table[column].iloc[data.jobs_in(mask)])
+        else:
+            values = data.options(column, mask)
+        options[key] = sorted(values)
+        available = set(options[key])
+        state[key] = [value for value in state.get(key) or [] if value in available]
+        if state[key] and key in ISIN_FILTERS:
+            mask &= data.isin(column, state[key])
+    return options, state
+
+
+def build_mask(data, state, ignore=(), search_scores=None, salary_index=None):
+    """Boolean mask over the location rows of ``data`` (a ``JobsDataset``) for ``state``.
+
+    ``ignore`` lists filter keys to leave out, e.g. ``("ciudades",)`` for the
+    map, which must keep showing every city so the user can click another one.
+    The bar chart's ``cargo`` selection only applies when it is not ignored.
+    ``search_scores`` are per-job relevance scores for ``state["busqueda"]``
+    from the full-text index; jobs scoring 0 are dropped, and None (no
+    searchable word in the query) filters nothing. With a
+    ``salary_index`` the salary range is a memoized binary search instead of
+    a comparison over every job.
+
+    Job-level filters are evaluated once per job and broadcast to the job's
+    locations; only the city filter looks at the location rows themselves.
+    """
+    jobs = data.jobs
+    job_mask = np.ones(len(jobs), dtype=bool)
+    mask = np.ones(len(data), dtype=bool)
+
+    if "salario" not in ignore and state.get("salario") is not None:
+        lo, hi = state["salario"]
+        if salary_index is not None:
+            in_range = salary_index.job_mask(lo, hi)
+            if in_range is not None:
+                job_mask &= in_range
+        else:
+            salario = jobs["salario"].to_numpy()
+            job_mask &= (salario >= lo) & (salario <= hi)
+
+    for key, column in ISIN_FILTERS.items():
+        selected = state.get(key)
+        table = data.table_of(column)
+        if key in ignore or not selected or table is None:
+            continue
+        if table is jobs:
+            job_mask &= table[column].isin(selected).to_numpy()
+        else:
+            mask &= table[column].isin(selected).to_numpy()
+
+    estudios = state.get("estudios")
+    if "estudios" not in ignore and estudios and "estudios_nbc" in jobs.columns:
+        # Jobs whose NBC set contains any selected NBC, checked once per distinct set
+        job_mask &= nbc_match(jobs["estudios_nbc"], estudios)
+
+    if "busqueda" not in ignore and state.get("busqueda") and search_scores is not None:
+        job_mask &= search_scores > 0
+
+    cargo = state.get("cargo")
+    if "cargo" not in ignore and cargo:
+        job_mask &= data.codes("cargo")[0] == data.code_of("cargo", cargo)
+
+    return mask & job_mask[data.job_id]
@@ -0,0 +1,151 @@
+"""Colombian municipality gazetteer used to place vacancies on the map.
+
+The bundled table (data/municipios_colombia.csv) is the DANE DIVIPOLA list:
+one row per municipality (and non-municipalized area), keyed by its five-digit
+DANE code, with the official name and department. Coordinates and population
+of the municipal seat and a pipe-separated list of alternate names come from
+GeoNames (https://www.geonames.org, CC BY 4.0); GeoNames names that differ from
+the official one ("Girardot City", "Cúcuta") are only kept as aliases.
+"""
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "municipios_colombia.csv")
+
+
+def fold_text(value):
+    """Lowercase, strip accents and punctuation so names compare loosely"""
+    if not isinstance(value, str):
+        return ""
+    value = unicodedata.normalize("NFKD", value)
+    value = "".join(c for c in value if not unicodedata.combining(c)).lower()
+    value = re.sub(r"[^a-z0-9]+", " ", value)
+    return " ".join(value.split())
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer(path=GAZETTEER_FILE):
+    """Read the bundled gazetteer, keeping DANE codes as zero-padded strings"""
+    gaz = pd.read_csv(
+        path,
+        dtype={"codigo_dane": str, "codigo_dpto": str, "municipio": str, "departamento": str, "alias": str},
+        keep_default_na=False,
+    )
+    if not gaz["codigo_dane"].str.fullmatch(r"\d{5}").all() or not gaz["codigo_dane"].is_unique:
+        raise ValueError(f"{path}: every municipality needs its own five-digit DANE code")
+    gaz["latitud"] = pd.to_numeric(gaz["latitud"], errors="coerce")
+    gaz["longitud"] = pd.to_numeric(gaz["longitud"], errors="coerce")
+    gaz["poblacion"] = pd.to_numeric(gaz["poblacion"], errors="coerce").fillna(0).astype("int64")
+    return gaz
+
+
+@lru_cache(maxsize=1)
+def alias_table(path=GAZETTEER_FILE):
+    """One row per folded alias, pointing at the place it most likely refers to.
+
+    Official names win over "municipio departamento" aliases, which win over
+    alternate names; ties go to the most populous place (e.g. "Florencia" is the
+    Caquetá capital, not the Cauca town).
+    """
+    gaz = load_gazetteer(path)
+    frames = [
+        pd.DataFrame({"gaz_id": gaz.index, "alias": gaz["municipio"], "prioridad": 0}),
+        pd.DataFrame({"gaz_id": gaz.index, "alias": gaz["municipio"] + " " + gaz["departamento"], "prioridad": 1}),
+    ]
+    alternates = gaz["alias"].str.split("|").explode()
+    alternates = alternates[alternates.astype(bool)]
+    frames.append(pd.DataFrame({"gaz_id": alternates.index, "alias": alternates.values, "prioridad": 2}))
+
+    aliases = pd.concat(frames, ignore_index=True)
+    aliases["clave"] = aliases["alias"].map(fold_text)
+    aliases["poblacion"] = gaz["poblacion"].to_numpy()[aliases["gaz_id"].to_numpy()]
+    aliases = aliases[aliases["clave"] != ""]
+    aliases = aliases.sort_values(["prioridad", "poblacion"], ascending=[True, False], kind="stable")
+    aliases = aliases.drop_duplicates("clave")
+
+    places = gaz[["codigo_dane", "codigo_dpto", "municipio", "departamento", "latitud", "longitud"]]
+    return aliases[["clave", "gaz_id"]].merge(places, left_on="gaz_id", right_index=True, how="left").set_index("clave")
+
+
+@lru_cache(maxsize=4096)
+def resolve_city(name):
+    """Return the canonical municipality name for a raw city string, or None"""
+    key = fold_text(name)
+    if not key:
+        return None
+    aliases = alias_table()
+    if key in aliases.index:
+        return aliases.at[key, "municipio"]
+
+    # Substring match for strings like "Cali Valle" or "Tulua (Valle)".
+    # Official names only, most populous first, and skip short names that
+    # would match inside unrelated words.
+    official = aliases[aliases.index == aliases["municipio"].map(fold_text)]
+    for clave, municipio in official["municipio"].items():
+        if len(clave) > 4 and re.search(rf"\b{re.escape(clave)}\b", key):
+            return municipio
+    return None
+
+
+def find_cities(text, max_words=4):
+    """Canonical names of the places mentioned in free text, in order of appearance.
+
+    Checks every run of up to ``max_words`` words against the alias table,
+    longest first, so "san jose del guaviare" wins over "san jose".
+    """
+    words = fold_text(text).split()
+    aliases = alias_table()
+    found = []
+    i = 0
+    while i < len(words):
+        for size in range(min(max_words, len(words) - i), 0, -1):
+            key = " ".join(words[i:i + size])
+            if len(key) > 3 and key in aliases.index:
+                found.append(aliases.at[key, "municipio"])
+                i += size
+                break
+        else:
+            i += 1
+    return list(dict.fromkeys(found))
+
+
+def attach_coordinates(df, city_col="ciudad"):
+    """Add latitud/longitud/codigo_dane columns to ``df`` in one vectorized join.
+
+    The city column is turned into a categorical so the gazetteer lookup runs
+    once per distinct city; rows are then filled by indexing with the codes.
+    """
+    cities = df[city_col].astype("category")
+    lookup = pd.DataFrame({"clave": [fold_text(c) for c in cities.cat.categories]})
+    lookup = lookup.merge(
+        alias_table()[["codigo_dane", "latitud", "longitud"]],
+        left_on="clave",
+        right_index=True,
+        how="left",
+    )
+
+    codes = cities.cat.codes.to_numpy()
+    valid = codes >= 0
+    take = np.where(valid, codes, 0)
+
+    def column(values, fill):
+        values = np.asarray(values, dtype=object if fill is None else float)
+        if len(values) == 0:
+            return np.full(len(codes), fill, dtype=values.dtype)
+        out = values[take]
+        out[~valid] = fill
+        return out
+
+    df["latitud"] = column(lookup["latitud"].to_numpy(), np.nan)
+    df["longitud"] = column(lookup["longitud"].to_numpy(), np.nan)
+    df["codigo_dane"] = column(lookup["codigo_dane"].to_numpy(), None)
+
+    missing = sorted(set(cities.cat.categories[lookup["latitud"].isna().to_numpy()]))
+    if missing:
+        print(f"Gazetteer: no coordinates for {len(missing)} cities: {missing[:20]}")
+    return df
@@ -0,0 +1,212 @@
+"""Normalized jobs/locations model of the processed dataset.
+
+The export has one row per OPEC job whose ``Vacantes`` text lists every city
+("3 - Armenia, 2 - Cali"). Instead of exploding that into one wide row per
+city, which copies the job's description, studies and experience texts onto
+every city row, the dataset is kept as two tables linked by integer keys:
+
+- ``jobs``: one row per job, with every job-level column;
+- ``locations``: one row per (job, city) with ``job_id`` (the job's position
+  in ``jobs``), ``ciudad``, ``vacantes_count``, coordinates and the raw entry.
+
+Location rows play the role the exploded rows used to: filter masks, row
+positions and the detail table are all expressed over them. Job-level filters
+are evaluated once per job and broadcast through ``job_id``; ``wide`` joins
+the job columns back only for the rows and columns that are actually shown or
+exported.
+
+Grouping columns (cargo, categoría, ficha, ...) are also kept as integer codes
+per job. A breakdown of the filtered rows is then one ``bincount`` of their
+job ids, shared by every column, plus a ``bincount`` over the (few) jobs per
+column, and a selection such as the bar chart's cargo is an integer compare.
+"""
+import numpy as np
+import pandas as pd
+
+
+class JobsDataset:
+    """Jobs and their locations, with the wide (exploded) view joined on demand"""
+
+    def __init__(self, jobs, locations, columns=None):
+        self.jobs = jobs
+        self.locations = locations
+        self.job_id = locations["job_id"].to_numpy()
+        # Column order of the wide view, as the exploded frame had it
+        self.columns = list(columns) if columns is not None else (
+            list(jobs.columns) + [c for c in locations.columns if c != "job_id"]
+        )
+        self.attrs = {}
+        self._codes = {}
+        if "opec" in jobs.columns:
+            self.opec_code = pd.factorize(jobs["opec"])[0]
+        else:
+            self.opec_code = np.arange(len(jobs))
+
+    @classmethod
+    def empty_dataset(cls):
+        return cls(pd.DataFrame(), pd.DataFrame({"job_id": np.zeros(0, dtype=np.int32)}))
+
+    @property
+    def empty(self):
+        return len(self.locations) == 0
+
+    def __len__(self):
+        return len(self.locations)
+
+    def table_of(self, column):
+        """The table (``jobs`` or ``locations``) holding ``column``, or None"""
+        if column in self.locations.columns:
+            return self.locations
+        if column in self.jobs.columns:
+            return self.jobs
+        return None
+
+    def wide(self, positions=None, columns=None):
+        """Location rows at ``positions`` (all if None) joined with their job columns.
+
+        Same columns, dtypes and index (the job's row label) as the exploded
+        frame, restricted to ``columns`` when given.
+        """
+        positions = np.arange(len(self.locations)) if positions is None else np.asarray(positions, dtype=np.int64)
+        job_rows = self.job_id[positions]
+        data = {}
+        for column in self.columns if columns is None else columns:
+            if column in self.locations.columns:
+                data[column] = self.locations[column].array.take(positions)
+            elif column in self.jobs.columns:
+                data[column] = self.jobs[column].array.take(job_rows)
+        return pd.DataFrame(data, index=self.jobs.index[job_rows])
+
+    def isin(self, column, values):
+        """Location-row mask of ``column`` in ``values``, evaluated once per job for job columns"""
+        table = self.table_of(column)
+        hits = table[column].isin(values).to_numpy()
+        return hits if table is self.locations else hits[self.job_id]
+
+    def jobs_in(self, mask):
+        """Sorted ids of the jobs with at least one location row in ``mask``"""
+        hits = np.bincount(self.job_id[mask], minlength=len(self.jobs))
+        return np.flatnonzero(hits)
+
+    def options(self, column, mask):
+        """Distinct non-null values of ``column`` among the location rows in ``mask``"""
+        table = self.table_of(column)
+        if table is None:
+            return []
+        rows = np.flatnonzero(mask) if table is self.locations else self.jobs_in(mask)
+        return table[column].iloc[rows].dropna().unique()
+
+    def kpis(self, mask):
+        """Headline numbers for the location rows in ``mask``.
+
+        Jobs are counted by distinct OPEC and the salary is averaged once per
+        OPEC, so a job offered in several cities weighs the same as any other.
+        """
+        jobs = self.jobs_in(mask)
+        opec_codes, first = np.unique(self.opec_code[jobs], return_index=True)
+        vacantes = self.locations["vacantes_count"].to_numpy()[mask].sum() if "vacantes_count" in self.locations.columns else 0
+        ciudad_codes = self.locations["ciudad"].cat.codes.to_numpy()[mask]
+        salario = 0
+        if "salario" in self.jobs.columns and len(jobs):
+            salario = self.jobs["salario"].to_numpy()[jobs[first]].mean()
+        return {
+            "empleos": len(opec_codes),
+            "vacantes": int(vacantes),
+            "ciudades": len(np.unique(ciudad_codes[ciudad_codes >= 0])),
+            "salario_promedio": salario,
+        }
+
+    def codes(self, column):
+        """Integer code per row of ``column`` (-1 if missing) and the labels they index.
+
+        Categoricals use their own codes; other columns are factorized once and
+        the codes are kept for the life of the dataset.
+        """
+        if column not in self._codes:
+            values = self.table_of(column)[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes, labels = values.cat.codes.to_numpy(), np.asarray(values.cat.categories, dtype=object)
+            else:
+                codes, labels = pd.factorize(values)
+                labels = np.asarray(labels, dtype=object)
+            self._codes[column] = (codes, labels)
+        return self._codes[column]
+
+    def code_of(self, column, value):
+        """Code of ``value`` in ``column``, or -1 if it does not occur"""
+        _, labels = self.codes(column)
+        hits = np.flatnonzero(labels == value)
+        return int(hits[0]) if len(hits) else -1
+
+    def select(self, positions, column, value):
+        """The location rows among ``positions`` whose ``column`` equals ``value``"""
+        codes, _ = self.codes(column)
+        if self.table_of(column) is self.jobs:
+            codes = codes[self.job_id[positions]]
+        else:
+            codes = codes[positions]
+        return positions[codes == self.code_of(column, value)]
+
+    def rows_per_job(self, positions):
+        """How many of the location rows at ``positions`` belong to each job"""
+        return np.bincount(self.job_id[positions], minlength=len(self.jobs))
+
+    def counts(self, column, job_rows):
+        """Location rows per label of job column ``column``, from ``rows_per_job``"""
+        codes, labels = self.codes(column)
+        present = codes >= 0
+        counts = np.bincount(codes[present], weights=job_rows[present], minlength=len(labels))
+        return counts.astype(np.int64), labels
+
+    def memory_usage(self):
+        """Bytes held by both tables"""
+        return int(
+            self.jobs.memory_usage(deep=True).sum() + self.locations.memory_usage(deep=True).sum()
+        )
+
+
+def top_counts(counts, labels, n=20, name=None):
+    """The ``n`` largest non-zero ``counts`` as a Series indexed by label.
+
+    Largest first, ties in label order, like ``value_counts().head(n)``; only
+    the top ``n`` are sorted.
+    """
+    present = np.flatnonzero(counts)
+    if len(present) > n:
+        present = present[np.argpartition(-counts[present], n - 1)[:n]]
+    order = present[np.lexsort((present, -counts[present]))]
+    return pd.Series(counts[order], index=pd.Index(labels[order], name=name), name="count")
+
+
+def split_locations(jobs, parse_entry, raw_column="ciudad_raw"):
+    """Split each job's comma-separated ``raw_column`` into location rows.
+
+    ``parse_entry(entry)`` returns ``(ciudad, vacantes)`` for one stripped
+    entry and is called once per distinct entry. Returns ``(jobs without
+    raw_column, locations)``; the caller adds coordinates to the locations.
+    """
+    jobs = jobs.reset_index(drop=True)
+    entries = jobs[raw_column].astype(str).str.split(",").explode().str.strip()
+    codes, uniques = pd.factorize(entries)
+    parsed = [parse_entry(entry) for entry in uniques]
+    cities = pd.Categorical([city for city, _ in parsed])
+    vacancies = np.array([count for _, count in parsed], dtype=np.int64)
+
+    locations = pd.DataFrame({
+        "job_id": entries.index.to_numpy().astype(np.int32),
+        "ciudad_raw": entries.to_numpy(),
+        "ciudad": pd.Categorical.from_codes(cities.codes[codes], categories=cities.categories),
+        "vacantes_count": vacancies[codes],
+    })
+    return jobs.drop(columns=[raw_column]), locations
+
+
+def single_locations(jobs, city_column="ciudad", vacancies_column="vacantes_count"):
+    """One location per job, for data that already has a city per row"""
+    jobs = jobs.reset_index(drop=True)
+    locations = pd.DataFrame({
+        "job_id": np.arange(len(jobs), dtype=np.int32),
+        "ciudad": pd.Categorical(jobs[city_column]),
+        "vacantes_count": jobs[vacancies_column].to_numpy() if vacancies_column in jobs.columns else 1,
+    })
+    return jobs.drop(columns=[c for c in (city_column, vacancies_column) if c in jobs.columns]), locations
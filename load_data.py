@@ -1,4 +1,5 @@
 import os
+import numpy as np
 import pandas as pd
 from supabase import create_client, Client
 from dotenv import load_dotenv
@@ -6,6 +7,56 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Target field -> (candidate headers in order of preference, value when none is present).
+# Headers are compared lowercased and stripped.
+FIELD_SOURCES = {
+    "cargo": (["cargo", "titulo", "nombre"], None),
+    "salario": (["salario", "sueldo"], 0),
+    "ciudad": (["ciudad", "municipio"], None),
+    "latitud": (["latitud", "lat"], 0.0),
+    "longitud": (["longitud", "lon"], 0.0),
+}
+FIELDS = list(FIELD_SOURCES)
+
+
+def resolve_columns(header):
+    """Source header for each target field (None when the file has none of the candidates)"""
+    lookup = {}
+    for col in header:
+        lookup.setdefault(str(col).lower().strip(), col)
+    return {
+        field: next((lookup[c] for c in candidates if c in lookup), None)
+        for field, (candidates, _) in FIELD_SOURCES.items()
+    }
+
+
+def read_columns(file_path, sources):
+    """One typed NumPy array per target field, plus the row count"""
+    used = [c for c in sources.values() if c is not None]
+    # With no matching column, still read one to count the rows
+    frame = pd.read_excel(file_path, usecols=used or [0])
+    n_rows = len(frame)
+    columns = {}
+    for field, source in sources.items():
+        default = FIELD_SOURCES[field][1]
+        if source is not None:
+            columns[field] = frame[source].to_numpy()
+        else:
+            columns[field] = np.full(n_rows, default, dtype=object if default is None else type(default))
+    return columns, n_rows
+
+
+def _json_values(array):
+    # Python scalars for the JSON encoder, missing values as null
+    return [None if v != v else v for v in array.tolist()]
+
+
+def encode_batch(columns, start, stop):
+    """Insert payload (list of row dicts) for rows ``start:stop``"""
+    values = [_json_values(columns[field][start:stop]) for field in FIELDS]
+    return [dict(zip(FIELDS, row)) for row in zip(*values)]
+
+
 def main():
     # Supabase credentials
     url: str = os.environ.get("SUPABASE_URL")
@@ -32,48 +83,23 @@ def main():
     print(f"Reading data from {file_path}...")
     
     try:
-        # Read Excel file
-        df = pd.read_excel(file_path)
-        
-        # Ensure columns exist and map them if necessary
-        # The prompt asks for: cargo, salario, ciudad, latitud, longitud
-        # We need to make sure the Excel file has these columns or we rename them.
-        # For now, I'll assume the Excel might have different names and we might need to inspect it.
-        # But per the prompt instructions, I will proceed assuming they match or I'll map them loosely.
-        # Let's just print the columns found to help debugging.
-        print(f"Columns found: {df.columns.tolist()}")
-
-        # Standardize column names to lowercase for easier mapping if needed
-        df.columns = [c.lower().strip() for c in df.columns]
-        
-        # Basic validation/mapping (adjust these based on actual file content if known)
-        # Assuming the file has columns that can be mapped to the target schema
-        required_columns = ["cargo", "salario", "ciudad", "latitud", "longitud"]
-        
-        # If the file has different headers, we might need a mapping dictionary.
-        # For this initial script, I will assume the user might need to adjust column names 
-        # or that the file already matches. 
-        
-        # Filter only required columns if they exist
-        data_to_upload = []
-        for index, row in df.iterrows():
-            record = {
-                "cargo": row.get("cargo", row.get("titulo", row.get("nombre", None))), # Fallbacks
-                "salario": row.get("salario", row.get("sueldo", 0)),
-                "ciudad": row.get("ciudad", row.get("municipio", None)),
-                "latitud": row.get("latitud", row.get("lat", 0.0)),
-                "longitud": row.get("longitud", row.get("lon", 0.0)),
-            }
-            data_to_upload.append(record)
-
-        print(f"Preparing to upload {len(data_to_upload)} records to 'Empleados Dian' table...")
-
-        # Upload in batches to avoid hitting payload limits
+        # Resolve the columns once from the header, then read only those
+        header = pd.read_excel(file_path, nrows=0).columns
+        print(f"Columns found: {header.tolist()}")
+        sources = resolve_columns(header)
+        print(f"Column mapping: {sources}")
+
+        columns, n_rows = read_columns(file_path, sources)
+
+        print(f"Preparing to upload {n_rows} records to 'Empleados Dian' table...")
+
+        # Upload in batches to avoid hitting payload limits; each batch is
+        # encoded from the typed columns only when it is sent
         batch_size = 100
         total_inserted = 0
         
-        for i in range(0, len(data_to_upload), batch_size):
-            batch = data_to_upload[i:i + batch_size]
+        for i in range(0, n_rows, batch_size):
+            batch = encode_batch(columns, i, min(i + batch_size, n_rows))
             try:
                 response = supabase.table("Empleados Dian").insert(batch).execute()
                 # count inserted rows - response.data should be a list of inserted rows
@@ -0,0 +1,378 @@
+"""Load test: N concurrent dashboard sessions against local stand-ins.
+
+Starts ``loadtest_stub`` (synthetic Supabase table + fake Gemini), launches
+``streamlit run streamlit_app.py`` pointed at it and opens N websocket
+sessions that talk to the server the way the browser does: each sends
+``rerun_script`` messages with its widget states and waits for
+``script_finished``. All sessions hit the same server process, so they share
+its caches and compete for its CPU exactly like real users.
+
+Each session goes through a realistic sequence: first load, text search, a
+click on a city in the map, a ficha filter, the salary slider, a click on a
+cargo bar, a question answered locally, an open question for Gemini and
+clearing the filters. Clicks and questions inside fragments rerun only the
+fragment, as in the browser.
+
+Reports p50/p95/p99 rerun latency per step (from sending the interaction to
+the end of the run) and the server's memory: RSS growth per open session and
+peak RSS. With ``--memory-profile`` the server runs with the per-stage memory
+profiler of ``memory_profile`` and the report adds each stage's allocation
+peak and DataFrame copies; ``--max-copy-kb`` makes the run fail when any run
+copied more than that, to catch copy regressions.
+
+    python loadtest.py --sessions 50 --rows 5000
+    python loadtest.py --sessions 5 --memory-profile --max-copy-kb 2048
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+import memory_profile
+from loadtest_stub import StubServer
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+SEARCH_TERMS = ["contaduria", "aduan", "auditor", "sistemas", "derecho", "gestor"]
+LOCAL_QUESTIONS = [
+    "¿Cuántas vacantes hay en Cali?",
+    "¿Cuál es el cargo mejor pagado?",
+    "¿Qué ciudades tienen más vacantes?",
+    "¿Cuál es el salario promedio?",
+]
+OPEN_QUESTIONS = [
+    "¿Por qué hay tantas vacantes en Bogotá?",
+    "Recomiéndame un cargo para un contador con experiencia",
+]
+
+
+def rss_bytes(pid):
+    """Resident set size of process ``pid`` (Linux)"""
+    with open(f"/proc/{pid}/statm") as fh:
+        return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class MemorySampler(threading.Thread):
+    """Tracks the peak RSS of the server while the test runs"""
+
+    def __init__(self, pid, interval=0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                self.peak = max(self.peak, rss_bytes(self.pid))
+            except OSError:
+                return
+            time.sleep(self.interval)
+
+
+def start_server(port, env):
+    """Start the dashboard with ``streamlit run`` and wait until it is healthy"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_FILE, "--server.headless=true",
+         f"--server.port={port}", "--browser.gatherUsageStats=false", "--logger.level=error"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(300):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.read() == b"ok":
+                    return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Streamlit server did not start")
+
+
+class BrowserSession:
+    """One simulated user speaking Streamlit's websocket protocol"""
+
+    def __init__(self, url, number, think_time=0.0):
+        self.url = url
+        self.number = number
+        self.rng = random.Random(number)
+        self.think_time = think_time
+        self.widgets = {}
+        self.states = {}
+        self.timings = []
+        self.errors = []
+        self.ws = None
+
+    async def open(self):
+        import websockets
+        self.ws = await websockets.connect(self.url, max_size=None, subprotocols=["streamlit"])
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, step, fragment_id=""):
+        """Send the widget states, wait for the run to finish and time it"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        if self.think_time:
+            await asyncio.sleep(self.rng.uniform(0, self.think_time))
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        message.rerun_script.fragment_id = fragment_id
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        # Buttons fire once, like a click in the browser
+        self.states = {k: v for k, v in self.states.items() if not v.HasField("trigger_value")}
+        if not fragment_id:
+            self.widgets = {}
+
+        started = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self.ws.recv())
+            kind = msg.WhichOneof("type")
+            if kind == "delta":
+                self._record_element(msg.delta)
+            elif kind == "script_finished" and msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        self.timings.append((step, (time.perf_counter() - started) * 1000))
+
+    def _record_element(self, delta):
+        if delta.WhichOneof("type") != "new_element":
+            return
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        proto = getattr(element, kind)
+        if kind == "exception":
+            self.errors.append(f"{proto.type}: {proto.message}")
+        elif getattr(proto, "id", ""):
+            self.widgets[proto.id] = (kind, proto, delta.fragment_id)
+
+    def find(self, kind, key=None, label=None):
+        for widget_id, (widget_kind, proto, fragment_id) in self.widgets.items():
+            if widget_kind != kind:
+                continue
+            if key is not None and not widget_id.endswith(f"-{key}"):
+                continue
+            if label is not None and getattr(proto, "label", None) != label:
+                continue
+            return widget_id, proto, fragment_id
+        return None
+
+    async def set_widget(self, step, kind, key=None, label=None, **value):
+        """Give a widget a new value (``string_value=...`` etc.) and rerun"""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        found = self.find(kind, key, label)
+        if found is None:
+            self.errors.append(f"{step}: no {kind} {key or label}")
+            return
+        widget_id, _, fragment_id = found
+        state = WidgetState(id=widget_id)
+        for field, field_value in value.items():
+            if isinstance(field_value, list):
+                getattr(state, field).data[:] = field_value
+            else:
+                setattr(state, field, field_value)
+        self.states[widget_id] = state
+        await self.rerun(step, fragment_id)
+
+    def chart_points(self, key, attribute):
+        """Values of ``attribute`` (hovertext, x) in the first trace of a chart"""
+        found = self.find("plotly_chart", key)
+        if found is None:
+            return []
+        trace = json.loads(found[1].spec)["data"][0]
+        values = trace.get(attribute, [])
+        return values if isinstance(values, list) else []
+
+    async def click_chart(self, step, key, attribute):
+        values = self.chart_points(key, attribute)
+        if not values:
+            # Nothing to click with the current filters
+            return
+        index = self.rng.randrange(len(values))
+        selection = {"selection": {"points": [{attribute: values[index], "point_index": index}],
+                                   "point_indices": [index], "box": [], "lasso": []}}
+        await self.set_widget(step, "plotly_chart", key, string_value=json.dumps(selection))
+
+    async def ask(self, step, question):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        text_area = self.find("text_area")
+        if text_area is not None:
+            self.states[text_area[0]] = WidgetState(id=text_area[0], string_value=question)
+        await self.set_widget(step, "button", label="Preguntar", trigger_value=True)
+
+    async def run(self):
+        await self.rerun("carga")
+        await self.set_widget("busqueda", "text_input", "search_filter_widget", string_value=self.rng.choice(SEARCH_TERMS))
+        await self.set_widget("limpiar_busqueda", "text_input", "search_filter_widget", string_value="")
+        await self.click_chart("clic_mapa", "map_selection", "hovertext")
+
+        ficha = self.find("multiselect", "proceso_filter_widget")
+        if ficha is not None and ficha[1].options:
+            await self.set_widget("ficha", "multiselect", "proceso_filter_widget",
+                                  string_array_value=[self.rng.choice(list(ficha[1].options))])
+
+        slider = self.find("slider", "salary_filter_widget")
+        if slider is not None:
+            lo, hi = slider[1].min, slider[1].max
+            await self.set_widget("salario", "slider", "salary_filter_widget", double_array_value=[lo + (hi - lo) / 4, hi])
+
+        await self.click_chart("clic_barra", "bar_selection", "x")
+        await self.ask("pregunta_local", self.rng.choice(LOCAL_QUESTIONS))
+        await self.ask("pregunta_gemini", self.rng.choice(OPEN_QUESTIONS))
+
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        for key in ("city_filter_widget", "proceso_filter_widget"):
+            found = self.find("multiselect", key)
+            if found is not None:
+                state = WidgetState(id=found[0])
+                state.string_array_value.SetInParent()
+                self.states[found[0]] = state
+        await self.rerun("limpiar_filtros")
+
+
+def percentiles(values):
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"n": len(values), "p50": p50, "p95": p95, "p99": p99, "max": max(values)}
+
+
+async def _drive(url, n_sessions, think_time, ramp_up, pid):
+    warm = BrowserSession(url, -1)
+    await warm.open()
+    await warm.rerun("carga")
+    await warm.close()
+    print(f"Warm-up load: {warm.timings[0][1]:.0f} ms {warm.errors or ''}")
+    await asyncio.sleep(1)
+    baseline = rss_bytes(pid)
+
+    sessions = [BrowserSession(url, i, think_time) for i in range(n_sessions)]
+
+    async def start(session):
+        await asyncio.sleep(ramp_up * session.number / max(n_sessions, 1))
+        await session.open()
+        try:
+            await session.run()
+        except Exception as e:
+            session.errors.append(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(start(s) for s in sessions))
+    elapsed = time.perf_counter() - started
+    # Memory with every session still connected
+    await asyncio.sleep(1)
+    open_rss = rss_bytes(pid)
+    for session in sessions:
+        await session.close()
+    return sessions, elapsed, baseline, open_rss
+
+
+def read_memory_log(path):
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def run_load_test(n_sessions, n_rows, think_time=0.5, gemini_delay=0.5, ramp_up=2.0, port=8599, profile_memory=False):
+    stub = StubServer(n_rows=n_rows, gemini_delay=gemini_delay).start()
+    print(f"Stub with {len(stub.rows)} rows at {stub.url}")
+    env = dict(os.environ, **stub.app_environment())
+    memory_log = None
+    if profile_memory:
+        fd, memory_log = tempfile.mkstemp(prefix="memory_profile_", suffix=".jsonl")
+        os.close(fd)
+        env.update({memory_profile.ENV_FLAG: "1", memory_profile.ENV_LOG: memory_log})
+    server = start_server(port, env)
+    sampler = MemorySampler(server.pid)
+    sampler.start()
+    try:
+        sessions, elapsed, baseline, open_rss = asyncio.run(
+            _drive(f"ws://127.0.0.1:{port}/_stcore/stream", n_sessions, think_time, ramp_up, server.pid)
+        )
+    finally:
+        sampler.running = False
+        server.terminate()
+        server.wait()
+        stub.stop()
+
+    memory_runs = []
+    if memory_log:
+        memory_runs = read_memory_log(memory_log)
+        os.remove(memory_log)
+
+    timings = pd.DataFrame([(name, ms) for s in sessions for name, ms in s.timings], columns=["paso", "ms"])
+    report = {step: percentiles(group["ms"].to_numpy()) for step, group in timings.groupby("paso", sort=False)}
+    report["todos"] = percentiles(timings["ms"].to_numpy())
+    return {
+        "sessions": n_sessions,
+        "elapsed_s": elapsed,
+        "latency_ms": report,
+        "rss_baseline": baseline,
+        "rss_per_session": (open_rss - baseline) / max(n_sessions, 1),
+        "rss_peak": sampler.peak,
+        "stub_requests": dict(stub.requests),
+        "memory_stages": memory_profile.summarize(memory_runs),
+        "max_run_copy_kb": max((sum(s["copias_kb"] for s in run["etapas"]) for run in memory_runs), default=None),
+        "errors": [f"sesión {s.number}: {e}" for s in sessions for e in s.errors],
+    }
+
+
+def print_report(result):
+    mb = 1024 * 1024
+    print(f"\n{result['sessions']} sesiones en {result['elapsed_s']:.1f} s")
+    table = pd.DataFrame(result["latency_ms"]).T
+    table["n"] = table["n"].astype(int)
+    print("\nLatencia por rerun (ms):")
+    print(table.round(1).to_string())
+    print("\nMemoria del servidor:")
+    print(f"  {result['rss_per_session'] / mb:.2f} MiB por sesión abierta "
+          f"(base {result['rss_baseline'] / mb:.0f} MiB, pico {result['rss_peak'] / mb:.0f} MiB)")
+    if result["memory_stages"]:
+        print("\nMemoria por etapa (tracemalloc; copias = DataFrames con datos nuevos):")
+        print(pd.DataFrame(result["memory_stages"]).to_string(index=False))
+        print(f"  Máximo copiado en una ejecución: {result['max_run_copy_kb']:,.0f} KiB")
+    print(f"\nPeticiones al stub: {result['stub_requests']}")
+    if result["errors"]:
+        print(f"\n{len(result['errors'])} errores, primeros:")
+        for error in result["errors"][:10]:
+            print(f"  {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the dashboard with N concurrent sessions")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=2000, help="synthetic rows served by the Supabase stub")
+    parser.add_argument("--think-time", type=float, default=0.5, help="max seconds between user actions")
+    parser.add_argument("--gemini-delay", type=float, default=0.5, help="seconds the fake Gemini takes to answer")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="seconds over which sessions start")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--memory-profile", action="store_true", help="profile memory per stage of every run (slower)")
+    parser.add_argument("--max-copy-kb", type=float, help="with --memory-profile, fail if a run copies more DataFrame data")
+    args = parser.parse_args()
+
+    result = run_load_test(
+        args.sessions, args.rows, args.think_time, args.gemini_delay, args.ramp_up, args.port,
+        profile_memory=args.memory_profile or args.max_copy_kb is not None,
+    )
+    print_report(result)
+    if args.max_copy_kb is not None and (result["max_run_copy_kb"] or 0) > args.max_copy_kb:
+        print(f"\nFALLO: una ejecución copió {result['max_run_copy_kb']:,.0f} KiB (límite {args.max_copy_kb:,.0f} KiB)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Opt-in memory profiling of each dashboard run, stage by stage.
+
+Set ``DASHBOARD_MEMORY_PROFILE=1`` to enable it. Runs (the whole app or a
+single fragment) are opened and closed by ``cross_filter.begin_run`` and
+``end_run``; the app marks where each stage starts with ``stage(name)``. For
+every stage the profiler records:
+
+- ``pico_kb``: the highest Python memory traced by ``tracemalloc`` above the
+  level at the start of the stage, i.e. its transient peak;
+- ``neto_kb``: what the stage still holds when it ends;
+- ``copias`` / ``copias_kb``: DataFrames created during the stage with newly
+  allocated data, and their size. Copy-on-write views (``rename``, column
+  selections, ...) share their parent's data and are not counted.
+
+Copies are counted per thread, so per run. ``tracemalloc`` is process-wide:
+with concurrent sessions a stage's peak also includes what other sessions
+allocated meanwhile, so compare peaks from single-user runs. Tracing slows
+allocation-heavy code down noticeably; leave it off in production.
+
+With ``DASHBOARD_MEMORY_PROFILE_LOG=<path>`` every finished run is also
+appended to that file as one JSON line; ``loadtest.py --memory-profile``
+uses it to report the stages of every session's runs.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+ENV_FLAG = "DASHBOARD_MEMORY_PROFILE"
+ENV_LOG = "DASHBOARD_MEMORY_PROFILE_LOG"
+
+_local = threading.local()
+_lock = threading.Lock()
+_installed = False
+
+
+def enabled():
+    return os.environ.get(ENV_FLAG, "") not in ("", "0")
+
+
+def _copied_bytes(frame):
+    """Bytes of the frame's blocks that no other frame references"""
+    try:
+        return sum(block.values.nbytes for block in frame._mgr.blocks if not block.refs.has_reference())
+    except AttributeError:
+        # pandas without copy-on-write references: count the whole frame
+        return int(frame.memory_usage(index=False).sum())
+
+
+def _install():
+    """Start tracing and count DataFrame construction; once per process"""
+    global _installed
+    with _lock:
+        if _installed:
+            return
+        import pandas as pd
+        from pandas.core.generic import NDFrame
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        original_init = NDFrame.__init__
+
+        def counting_init(self, *args, **kwargs):
+            original_init(self, *args, **kwargs)
+            run = getattr(_local, "run", None)
+            if run is not None and isinstance(self, pd.DataFrame):
+                copied = _copied_bytes(self)
+                if copied:
+                    run.count_copy(copied)
+
+        NDFrame.__init__ = counting_init
+        _installed = True
+
+
+class RunProfile:
+    def __init__(self, scope):
+        self.scope = scope
+        self.started = time.time()
+        self.stages = []
+        self._current = None
+
+    def stage(self, name):
+        if self._current is not None and self._current["etapa"] == name:
+            return
+        self._close()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        self._current = {
+            "etapa": name, "base": current, "t0": time.perf_counter(), "copias": 0, "copias_bytes": 0,
+        }
+
+    def count_copy(self, nbytes):
+        if self._current is not None:
+            self._current["copias"] += 1
+            self._current["copias_bytes"] += nbytes
+
+    def _close(self):
+        stage = self._current
+        if stage is None:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        self.stages.append({
+            "etapa": stage["etapa"],
+            "ms": round((time.perf_counter() - stage["t0"]) * 1000, 1),
+            "pico_kb": round(max(peak - stage["base"], 0) / 1024, 1),
+            "neto_kb": round((current - stage["base"]) / 1024, 1),
+            "copias": stage["copias"],
+            "copias_kb": round(stage["copias_bytes"] / 1024, 1),
+        })
+        self._current = None
+
+    def finish(self):
+        self._close()
+        return {"alcance": self.scope, "inicio": self.started, "etapas": self.stages}
+
+
+def start(scope):
+    """Open a profiled run on this thread; a no-op unless profiling is enabled"""
+    if not enabled():
+        return
+    _install()
+    _local.run = RunProfile(scope)
+    _local.run.stage(scope)
+
+
+def stage(name):
+    """Close the current stage of this thread's run and open ``name``"""
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.stage(name)
+
+
+def finish():
+    """Close this thread's run; returns its record, or None when not profiling"""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    _local.run = None
+    record = run.finish()
+    path = os.environ.get(ENV_LOG)
+    if path:
+        with _lock, open(path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(record) + "\n")
+    return record
+
+
+def summarize(records):
+    """Per (scope, stage) statistics over run records, as rows for a table"""
+    grouped = {}
+    for record in records:
+        for item in record["etapas"]:
+            grouped.setdefault((record["alcance"], item["etapa"]), []).append(item)
+    rows = []
+    for (scope, name), items in grouped.items():
+        peaks = sorted(item["pico_kb"] for item in items)
+        rows.append({
+            "alcance": scope,
+            "etapa": name,
+            "n": len(items),
+            "pico_kb_p50": peaks[len(peaks) // 2],
+            "pico_kb_max": peaks[-1],
+            "copias_media": round(sum(item["copias"] for item in items) / len(items), 1),
+            "copias_max": max(item["copias"] for item in items),
+            "copias_kb_max": max(item["copias_kb"] for item in items),
+        })
+    return rows
@@ -0,0 +1,211 @@
+"""Answer plain aggregate questions locally before calling Gemini.
+
+Questions like "¿cuántas vacantes hay en Cali?" or "¿cuál es el cargo mejor
+pagado en Bogotá?" are answered straight from the DataFrame in a few
+milliseconds. ``answer_locally`` returns None for anything it does not
+recognise (a question about a job or place missing from the data, or one
+that asks for an explanation), and the caller falls back to ``chat_with_data``.
+"""
+import re
+import time
+
+from ai_context import job_rows, money
+from gazetteer import find_cities, fold_text
+
+# Questions that need reasoning, not a number: always go to Gemini
+OPEN_ENDED = re.compile(
+    r"\b(por que|porque|explica|analiza|compara|recomienda|recomiendas|deberia|opinas|tendencia|resume|resumen|consejo)"
+)
+
+OPEC_LOOKUP = re.compile(r"\bopec\s*(?:no\s*)?(\d{4,})\b")
+CITY_RANKING = re.compile(
+    r"\b(ciudad|ciudades|donde|municipio|municipios)\b.*\b(mas|mayor|menos|menor)\b.*\b(vacantes|empleos|plazas|oportunidades)\b"
+)
+CARGO_RANKING = re.compile(r"\b(cargo|cargos)\b.*\b(mas|mayor)\b.*\b(vacantes|empleos|plazas|comun|comunes|frecuentes)\b")
+BEST_PAID = re.compile(r"\b(mejor|mas) (pagad|remunerad)\w*|\b(mayor|mas alto) salario\b|\bsalario mas alto\b|\bgana mas\b|\bpaga mas\b")
+WORST_PAID = re.compile(r"\b(peor|menos) (pagad|remunerad)\w*|\bmenor salario\b|\bsalario mas bajo\b|\bgana menos\b|\bpaga menos\b")
+AVERAGE_SALARY = re.compile(r"\bsalario (promedio|medio)\b|\bpromedio (de|del) salario\b|\bcuanto (gana|ganan|paga|pagan)\b|\bsalario de\b")
+COUNT_VACANCIES = re.compile(r"\bcuant[ao]s (vacantes|plazas)\b|\b(numero|total) de (vacantes|plazas)\b")
+COUNT_JOBS = re.compile(r"\bcuant[ao]s (empleos|cargos|opec|ofertas)\b|\b(numero|total) de (empleos|opec|ofertas)\b")
+AGGREGATE_PATTERNS = (CITY_RANKING, CARGO_RANKING, BEST_PAID, WORST_PAID, AVERAGE_SALARY, COUNT_VACANCIES, COUNT_JOBS)
+CONVOCATORIA_WORDS = {"ingreso": "Ingreso", "ascenso": "Ascenso", "discapacidad": "Discapacidad"}
+
+# "para abogados", "de un ingeniero": who the question is about, up to the next connector
+ENTITY_PHRASE = re.compile(
+    r"\b(?:para|de)\s+(?:(?:un|una|unos|unas|el|la|los|las)\s+)?(.+?)(?=\s+(?:en|de|del|con|y|o|que|para|por|hay)\b|$)"
+)
+# Words that name no one in particular ("total de vacantes", "promedio de salario")
+GENERIC_WORDS = {
+    "vacantes", "plazas", "empleos", "empleo", "opec", "ofertas", "cargo", "cargos", "salario", "salarios",
+    "todo", "todos", "todas", "total", "dian", "convocatoria", "convocatorias", "ciudad", "ciudades",
+    "colombia", "pais", "trabajo",
+}
+
+
+def find_cargos(folded_question, dataframe):
+    """Cargo names from the data that appear in the question, longest first"""
+    if "cargo" not in dataframe.columns:
+        return []
+    padded = f" {folded_question} "
+    names = sorted(dataframe["cargo"].dropna().unique(), key=lambda c: -len(str(c)))
+    found = []
+    for name in names:
+        key = fold_text(str(name))
+        if key and f" {key} " in padded:
+            found.append(name)
+            # "analista ii" must not also count as "analista i"
+            padded = padded.replace(f" {key} ", " ")
+    return found
+
+
+def unresolved_entities(question, dataframe):
+    """Phrases like "para abogados" that name no city, cargo or convocatoria of ``dataframe``.
+
+    ``scope_rows`` can only narrow the rows to what it recognises, so a
+    question about anything else must not get the broader aggregate.
+    """
+    unresolved = []
+    for phrase in ENTITY_PHRASE.findall(fold_text(question)):
+        if all(word in GENERIC_WORDS or word.isdigit() for word in phrase.split()):
+            continue
+        # A place without rows is resolved too: scope_rows answers that it has no jobs
+        if find_cargos(phrase, dataframe) or find_cities(phrase):
+            continue
+        if any(re.search(rf"\b{word}\b", phrase) for word in CONVOCATORIA_WORDS):
+            continue
+        unresolved.append(phrase)
+    return unresolved
+
+
+def scope_rows(question, dataframe):
+    """Rows for the cities, cargos and convocatoria type named in the question; may be empty"""
+    folded = fold_text(question)
+    scope = dataframe
+    described = []
+
+    # Places without rows (e.g. outside the city filter) leave the scope empty
+    cities = find_cities(question) if "ciudad" in dataframe.columns else []
+    if cities:
+        scope = scope[scope["ciudad"].isin(cities)]
+        described.append("en " + ", ".join(cities))
+
+    cargos = find_cargos(folded, dataframe)
+    if cargos:
+        scope = scope[scope["cargo"].isin(cargos)]
+        described.append("para " + ", ".join(cargos))
+
+    if "convocatoria" in dataframe.columns:
+        labels = [label for word, label in CONVOCATORIA_WORDS.items() if re.search(rf"\b{word}\b", folded)]
+        for label in labels:
+            scope = scope[scope["convocatoria"].astype(str).str.contains(label, case=False, na=False)]
+        if labels:
+            described.append("en convocatorias de " + " y ".join(labels))
+
+    return scope, cargos, " ".join(described)
+
+
+def answer_locally(question, dataframe):
+    """Return ``(intent, markdown answer)`` for aggregate questions, else None"""
+    started = time.perf_counter()
+    folded = fold_text(question)
+    if not folded or dataframe.empty or OPEN_ENDED.search(folded):
+        return None
+
+    result = _route(question, folded, dataframe)
+    if result is not None:
+        print(f"Question router: local '{result[0]}' answer in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return result
+
+
+def _route(question, folded, dataframe):
+    match = OPEC_LOOKUP.search(folded)
+    if match and "opec" in dataframe.columns:
+        return "opec", _opec_details(dataframe, match.group(1))
+
+    if not any(pattern.search(folded) for pattern in AGGREGATE_PATTERNS):
+        return None
+    if unresolved_entities(question, dataframe):
+        return None
+
+    scope, cargos, described = scope_rows(question, dataframe)
+    suffix = f" {described}" if described else ""
+    if scope.empty:
+        return "sin_datos", f"No hay empleos{suffix} con los filtros actuales."
+    jobs = job_rows(scope)
+
+    if CITY_RANKING.search(folded) and "ciudad" in scope.columns:
+        column = "vacantes_count" if "vacantes" in folded or "plazas" in folded else "opec"
+        by_city = scope.groupby("ciudad", observed=True)
+        totals = by_city[column].sum() if column == "vacantes_count" else by_city["opec"].nunique()
+        ascending = bool(re.search(r"\b(menos|menor)\b", folded))
+        totals = totals.sort_values(ascending=ascending).head(10)
+        unit = "vacantes" if column == "vacantes_count" else "empleos"
+        lines = [f"{i}. **{city}**: {int(n)} {unit}" for i, (city, n) in enumerate(totals.items(), 1)]
+        head = "menos" if ascending else "más"
+        return "ranking_ciudades", f"Ciudades con {head} {unit}{suffix}:\n\n" + "\n".join(lines)
+
+    if CARGO_RANKING.search(folded) and not cargos:
+        if "vacantes" in folded or "plazas" in folded:
+            totals = scope.groupby("cargo", observed=True)["vacantes_count"].sum()
+            unit = "vacantes"
+        else:
+            totals = jobs["cargo"].value_counts()
+            unit = "empleos"
+        totals = totals.sort_values(ascending=False).head(10)
+        lines = [f"{i}. **{cargo}**: {int(n)} {unit}" for i, (cargo, n) in enumerate(totals.items(), 1)]
+        return "ranking_cargos", f"Cargos con más {unit}{suffix}:\n\n" + "\n".join(lines)
+
+    for intent, pattern, ascending in (("mejor_pagado", BEST_PAID, False), ("peor_pagado", WORST_PAID, True)):
+        if pattern.search(folded):
+            by_cargo = jobs.groupby("cargo", observed=True)["salario"].max().sort_values(ascending=ascending)
+            best_salary = by_cargo.iloc[0]
+            ties = by_cargo[by_cargo == best_salary].index.tolist()
+            label = "mejor" if not ascending else "peor"
+            lines = [f"{i}. {cargo}: {money(salary)}" for i, (cargo, salary) in enumerate(by_cargo.head(5).items(), 1)]
+            names = ", ".join(f"**{c}**" for c in ties)
+            return intent, (
+                f"El cargo {label} pagado{suffix} es {names}, con un salario de {money(best_salary)}.\n\n"
+                + "\n".join(lines)
+            )
+
+    if AVERAGE_SALARY.search(folded):
+        salaries = jobs["salario"]
+        text = (
+            f"Salario{suffix}: promedio {money(salaries.mean())}, mediana {money(salaries.median())}, "
+            f"rango {money(salaries.min())} - {money(salaries.max())} ({len(jobs)} empleos)."
+        )
+        if len(cargos) > 1 or (not cargos and jobs["cargo"].nunique() <= 10):
+            by_cargo = jobs.groupby("cargo", observed=True)["salario"].mean().sort_values(ascending=False)
+            text += "\n\n" + "\n".join(f"- {cargo}: {money(s)}" for cargo, s in by_cargo.items())
+        return "salario", text
+
+    if COUNT_VACANCIES.search(folded):
+        total = int(scope["vacantes_count"].sum()) if "vacantes_count" in scope.columns else len(jobs)
+        return "conteo_vacantes", f"Hay **{total}** vacantes{suffix} ({len(jobs)} empleos OPEC)."
+
+    if COUNT_JOBS.search(folded):
+        total = int(scope["vacantes_count"].sum()) if "vacantes_count" in scope.columns else len(jobs)
+        return "conteo_empleos", f"Hay **{len(jobs)}** empleos OPEC{suffix}, con {total} vacantes en total."
+
+    return None
+
+
+def _opec_details(dataframe, opec):
+    rows = dataframe[dataframe["opec"].astype(str) == opec]
+    if rows.empty:
+        return f"No se encontró la OPEC {opec} con los filtros actuales."
+    job = rows.iloc[0]
+    lines = [f"**OPEC {opec}** - {job.get('cargo', '')}"]
+    if "salario" in rows.columns:
+        lines.append(f"- Salario: {money(job['salario'])}")
+    if "convocatoria" in rows.columns:
+        lines.append(f"- Convocatoria: {job['convocatoria']}")
+    if "ciudad" in rows.columns:
+        places = ", ".join(
+            f"{c} ({int(v)})" for c, v in zip(rows["ciudad"], rows.get("vacantes_count", [1] * len(rows)))
+        )
+        lines.append(f"- Ciudades (vacantes): {places}")
+    for column, label in (("estudio", "Estudio"), ("experiencia", "Experiencia")):
+        if column in rows.columns and isinstance(job[column], str):
+            lines.append(f"- {label}: {' '.join(job[column].split())}")
+    return "\n".join(lines)
@@ -0,0 +1,124 @@
+"""Process-wide cache of filter results, shared by every session.
+
+Many sessions land on the same filters (the defaults, a popular city, a shared
+link). A result is keyed on the dataset version plus the canonical filter key
+of ``filter_engine.filter_key``, so the order in which options were picked or
+how the search was typed does not matter, and holds everything the page
+derives from the filters: the filtered location rows, the KPIs, the top-N
+breakdowns (cargo for the bar chart, categoría, ficha, NBC) and the map
+aggregates.
+
+Entries are evicted least recently used first once their total size passes
+``max_bytes``. Cached arrays are read-only: every session shares them.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from filter_engine import build_mask
+from jobs_model import top_counts
+from text_features import nbc_counts
+
+TOP_N = 20
+# Job columns broken down for the filtered rows
+BREAKDOWNS = ["cargo", "categoria", "proceso", "estudios_nbc"]
+MAP_COLUMNS = ["latitud", "longitud"]
+
+
+class FilterResult:
+    """Rows and aggregates for one filter state"""
+
+    def __init__(self, positions, kpis, breakdowns, map_points):
+        self.positions = positions
+        self.kpis = kpis
+        self.breakdowns = breakdowns
+        self.map_points = map_points
+        self.nbytes = positions.nbytes + sum(top.memory_usage(deep=True) for top in breakdowns.values())
+        if map_points is not None:
+            self.nbytes += int(map_points.memory_usage(deep=True).sum())
+
+
+def compute_filter_result(data, state, search_scores=None, salary_index=None):
+    """Filter ``data`` (a ``JobsDataset``) by ``state`` and derive the page aggregates.
+
+    The bar chart's cargo selection is not applied: it only narrows the detail
+    table, from ``positions``. ``breakdowns`` holds the top ``TOP_N`` values
+    of each ``BREAKDOWNS`` column present, by filtered location rows; a job
+    with several NBCs counts for each. ``map_points`` ignores the city filter
+    so the map keeps every city clickable, and is None without coordinates.
+    """
+    mask = build_mask(data, state, ignore=("cargo",), search_scores=search_scores, salary_index=salary_index)
+    positions = np.flatnonzero(mask)
+    if search_scores is not None:
+        # Most relevant jobs first in the detail table
+        positions = positions[np.argsort(-search_scores[data.job_id[positions]], kind="stable")]
+    positions.setflags(write=False)
+
+    # One pass over the filtered rows serves every breakdown
+    job_rows = data.rows_per_job(positions)
+    breakdowns = {}
+    for column in BREAKDOWNS:
+        if column not in data.jobs.columns:
+            continue
+        counts, labels = data.counts(column, job_rows)
+        if column == "estudios_nbc":
+            counts, labels = nbc_counts(data.jobs[column], counts)
+        breakdowns[column] = top_counts(counts, labels, TOP_N, name=column)
+
+    map_points = None
+    if all(col in data.locations.columns for col in MAP_COLUMNS):
+        map_mask = build_mask(data, state, ignore=("ciudades", "cargo"), search_scores=search_scores, salary_index=salary_index)
+        map_data = data.locations[map_mask].dropna(subset=MAP_COLUMNS)
+        # Vacancies per location, with the column names Plotly expects
+        map_points = (
+            map_data.groupby(["latitud", "longitud", "ciudad"], observed=True)["vacantes_count"].sum().reset_index()
+            .rename(columns={"latitud": "lat", "longitud": "lon", "vacantes_count": "vacantes"})
+        )
+
+    return FilterResult(positions, data.kpis(mask), breakdowns, map_points)
+
+
+class ResultCache:
+    """LRU of ``FilterResult`` by key, bounded by the total size of its entries"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key):
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._results.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            previous = self._results.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self._results[key] = result
+            self.nbytes += result.nbytes
+            # Oldest first; the entry just added stays even if it alone is over the cap
+            while self.nbytes > self.max_bytes and len(self._results) > 1:
+                _, evicted = self._results.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return result
+
+    def get_or_compute(self, key, compute, *args, **kwargs):
+        """Cached result for ``key``, computing and storing it on a miss"""
+        result = self.get(key)
+        if result is None:
+            result = self.put(key, compute(*args, **kwargs))
+        return result
@@ -0,0 +1,83 @@
+"""Sorted salary index for the salary range filter and the salary panel.
+
+Job salaries are sorted once per dataset. A slider range then resolves with
+two ``searchsorted`` calls into a contiguous slice of the sort order, which is
+scattered into a job mask; masks are memoized on the ``(lo, hi)`` tuple, so
+the main filter and the map filter (and every session sharing the index) reuse
+the same array until the slider moves.
+
+The same sort order gives per-group salary quantiles and histograms (by
+category, convocatoria, ficha, ...) at build time, so the salary panel only
+reads precomputed tables.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+QUANTILES = {"p25": 0.25, "mediana": 0.5, "p75": 0.75}
+HISTOGRAM_BINS = 12
+
+
+class SalaryIndex:
+    def __init__(self, salaries, groups=None, bins=HISTOGRAM_BINS):
+        """``salaries`` per job; ``groups`` maps a column name to its per-job values"""
+        salaries = np.asarray(salaries, dtype=np.float64)
+        self.order = np.argsort(salaries, kind="stable")
+        self.sorted = salaries[self.order]
+        self.size = len(salaries)
+        self.min = float(self.sorted[0]) if self.size else 0.0
+        self.max = float(self.sorted[-1]) if self.size else 0.0
+        self.edges = np.linspace(self.min, self.max, bins + 1)
+        self._range_mask = lru_cache(maxsize=32)(self._build_range_mask)
+
+        self.tables = {}
+        self.histograms = {}
+        for column, values in (groups or {}).items():
+            self.tables[column], self.histograms[column] = self._group_stats(values)
+
+    def _build_range_mask(self, lo, hi):
+        start = np.searchsorted(self.sorted, lo, side="left")
+        stop = np.searchsorted(self.sorted, hi, side="right")
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.order[start:stop]] = True
+        # Shared between callers and sessions: nobody may modify it in place
+        mask.setflags(write=False)
+        return mask
+
+    def job_mask(self, lo, hi):
+        """Read-only mask of the jobs with ``lo <= salario <= hi``, or None if that is every job"""
+        if lo <= self.min and hi >= self.max:
+            return None
+        return self._range_mask(float(lo), float(hi))
+
+    def _group_stats(self, values):
+        codes, labels = pd.factorize(pd.Series(values).to_numpy()[self.order])
+        # Stable sort by group keeps each group's salaries in ascending order
+        by_group = np.argsort(codes, kind="stable")
+        grouped = self.sorted[by_group]
+        bounds = np.searchsorted(codes[by_group], np.arange(len(labels) + 1))
+
+        rows = []
+        counts = np.zeros((len(labels), len(self.edges) - 1), dtype=np.int64)
+        for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            group = grouped[start:stop]
+            row = {"empleos": len(group), "min": group[0], "max": group[-1]}
+            row.update({name: np.quantile(group, q) for name, q in QUANTILES.items()})
+            rows.append(row)
+            cuts = np.searchsorted(group, self.edges, side="left")
+            cuts[-1] = len(group)
+            counts[i] = np.diff(cuts)
+
+        table = pd.DataFrame(rows, index=pd.Index(labels, name="grupo"), columns=["empleos", "min", "p25", "mediana", "p75", "max"])
+        order = np.argsort(-table["empleos"].to_numpy(), kind="stable")
+        return table.iloc[order], pd.DataFrame(counts[order], index=table.index[order])
+
+    def quantile_table(self, column):
+        """Salary count/min/p25/median/p75/max per value of ``column``, largest groups first"""
+        return self.tables.get(column, pd.DataFrame())
+
+    def histogram(self, column, group):
+        """Jobs per salary bin for one value of ``column``, with the bin bounds"""
+        counts = self.histograms[column].loc[group].to_numpy()
+        return pd.DataFrame({"desde": self.edges[:-1], "hasta": self.edges[1:], "empleos": counts})
@@ -0,0 +1,190 @@
+"""Inverted index over the job texts, shared by the search box and the assistant.
+
+Documents are unique OPECs of the jobs table; ``row_scores`` maps them back
+to the table's rows, and the dashboard broadcasts those to the city rows
+through ``job_id``. Postings are stored CSR-style in vocabulary order, so every term that
+starts with a query prefix maps to one contiguous slice of the posting arrays
+and a query costs a couple of ``searchsorted`` calls plus a ``bincount``.
+
+The same postings answer two kinds of query:
+
+- ``doc_scores``/``row_scores``: the sidebar search, every word must match
+  as a prefix;
+- ``top``: Okapi BM25 ranking of whole words, used by the assistant
+  (ai_context.py) to pick the jobs related to a question.
+"""
+import math
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from gazetteer import fold_text
+from snapshot import frame_fingerprint, keyed_name, load_snapshot, prune_snapshots, save_snapshot
+
+SEARCH_COLUMNS = ["cargo", "descripcion", "estudio", "experiencia"]
+MIN_TERM_LENGTH = 2
+# Bumped when the stored payload changes, so older snapshots are rebuilt
+INDEX_FORMAT = 2
+# Index snapshots kept on disk, one per dataset (e.g. year selection)
+KEPT_SNAPSHOTS = 4
+
+# Very common Spanish words that only add noise to ranking a question
+STOPWORDS = {
+    "a", "al", "con", "cual", "cuales", "cuanto", "cuantos", "cuantas", "de", "del", "donde",
+    "el", "en", "es", "esta", "estan", "hay", "la", "las", "lo", "los", "mas", "me", "mi",
+    "para", "por", "que", "quien", "se", "sin", "sobre", "su", "sus", "un", "una", "y", "o",
+    "cargo", "cargos", "empleo", "empleos", "vacante", "vacantes",
+}
+
+
+def tokenize(text, stopwords=()):
+    """Accent-insensitive word tokens, without ``stopwords``"""
+    return [t for t in fold_text(text).split() if len(t) >= MIN_TERM_LENGTH and t not in stopwords]
+
+
+class SearchIndex:
+    def __init__(self, vocab, indptr, doc_ids, tfs, weights, doc_lengths, doc_rows, row_doc, n_docs):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.weights = weights
+        self.doc_lengths = doc_lengths
+        self.doc_rows = doc_rows
+        self.row_doc = row_doc
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, dataframe):
+        """Index the text columns of ``dataframe``, one document per OPEC"""
+        if "opec" in dataframe.columns:
+            doc_codes, doc_keys = pd.factorize(dataframe["opec"])
+            first_rows = pd.Series(np.arange(len(dataframe))).groupby(doc_codes).first().to_numpy()
+        else:
+            doc_codes = np.arange(len(dataframe))
+            first_rows = doc_codes
+        docs = dataframe.iloc[first_rows]
+
+        text = pd.Series("", index=docs.index)
+        for col in SEARCH_COLUMNS:
+            if col in docs.columns:
+                text = text + " " + docs[col].fillna("").astype(str)
+
+        term_docs = {}
+        doc_lengths = np.zeros(len(docs), dtype=np.float32)
+        for doc_id, value in enumerate(text.tolist()):
+            counts = Counter(tokenize(value))
+            doc_lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                term_docs.setdefault(term, []).append((doc_id, tf))
+
+        n_docs = len(docs)
+        vocab = np.array(sorted(term_docs), dtype=object)
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        doc_ids, tfs, weights = [], [], []
+        for i, term in enumerate(vocab):
+            postings = term_docs[term]
+            idf = math.log(1 + n_docs / len(postings))
+            for doc_id, tf in postings:
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+                weights.append((1 + math.log(tf)) * idf)
+            indptr[i + 1] = len(doc_ids)
+
+        return cls(
+            vocab=vocab,
+            indptr=indptr,
+            doc_ids=np.asarray(doc_ids, dtype=np.int32),
+            tfs=np.asarray(tfs, dtype=np.float32),
+            weights=np.asarray(weights, dtype=np.float32),
+            doc_lengths=doc_lengths,
+            doc_rows=np.asarray(first_rows, dtype=np.int64),
+            row_doc=np.asarray(doc_codes, dtype=np.int32),
+            n_docs=n_docs,
+        )
+
+    def documents(self, dataframe):
+        """One row of the indexed ``dataframe`` per document, in document order"""
+        return dataframe.iloc[self.doc_rows]
+
+    def doc_scores(self, query):
+        """Relevance per document; 0 unless every query word matches (as a prefix).
+
+        None when the query has no searchable word (e.g. "a"): it filters nothing.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return None
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        matched_all = np.ones(self.n_docs, dtype=bool)
+        for term in dict.fromkeys(terms):
+            # Every vocabulary entry starting with `term` is in [lo, hi)
+            lo = np.searchsorted(self.vocab, term, side="left")
+            hi = np.searchsorted(self.vocab, term + "\uffff", side="left")
+            start, end = self.indptr[lo], self.indptr[hi]
+            term_scores = np.bincount(
+                self.doc_ids[start:end], weights=self.weights[start:end], minlength=self.n_docs
+            )
+            matched_all &= term_scores > 0
+            scores += term_scores.astype(np.float32)
+        scores[~matched_all] = 0
+        return scores
+
+    def row_scores(self, query):
+        """Relevance for every row of the indexed dataframe (0 = no match), or None like ``doc_scores``"""
+        scores = self.doc_scores(query)
+        return None if scores is None else scores[self.row_doc]
+
+    def bm25_scores(self, query, k1=1.5, b=0.75, stopwords=STOPWORDS):
+        """Okapi BM25 score per document for the whole words of ``query``"""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        if not self.n_docs:
+            return scores
+        norm = k1 * (1 - b + b * self.doc_lengths / max(float(self.doc_lengths.mean()), 1.0))
+        for term in set(tokenize(query, stopwords)):
+            i = np.searchsorted(self.vocab, term)
+            if i == len(self.vocab) or self.vocab[i] != term:
+                continue
+            start, end = self.indptr[i], self.indptr[i + 1]
+            ids, tfs = self.doc_ids[start:end], self.tfs[start:end]
+            idf = math.log(1 + (self.n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (k1 + 1) / (tfs + norm[ids])
+        return scores
+
+    def top(self, query, k=10, allowed=None):
+        """Ids of the ``k`` documents ranking best for ``query``, optionally within ``allowed``"""
+        scores = self.bm25_scores(query)
+        if allowed is not None:
+            scores = np.where(allowed, scores, 0)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def to_payload(self):
+        return {
+            "vocab": self.vocab,
+            "indptr": self.indptr,
+            "doc_ids": self.doc_ids,
+            "tfs": self.tfs,
+            "weights": self.weights,
+            "doc_lengths": self.doc_lengths,
+            "doc_rows": self.doc_rows,
+            "row_doc": self.row_doc,
+            "n_docs": self.n_docs,
+        }
+
+
+def load_or_build_index(dataframe):
+    """Reuse the index stored with the dataset snapshot when the data is unchanged"""
+    fingerprint = f"v{INDEX_FORMAT}:" + frame_fingerprint(dataframe, ["opec"] + SEARCH_COLUMNS)
+    # One file per dataset, so year selections do not overwrite each other's index
+    name = keyed_name("search_index", fingerprint)
+    payload = load_snapshot(name, fingerprint)
+    if payload is not None:
+        return SearchIndex(**payload)
+    index = SearchIndex.build(dataframe)
+    save_snapshot(name, fingerprint, index.to_payload())
+    prune_snapshots("search_index", KEPT_SNAPSHOTS)
+    return index
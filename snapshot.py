@@ -0,0 +1,83 @@
+"""On-disk snapshot of objects derived from the dataset.
+
+Objects are pickled under ``.cache/`` together with the fingerprint of the
+data they were built from, so a cold start can reuse them whenever the
+dataset has not changed instead of rebuilding them. Objects that exist once
+per dataset (one per year selection, say) go under ``keyed_name`` names and
+are pruned to the most recently used few with ``prune_snapshots``.
+"""
+import glob
+import hashlib
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+
+def frame_fingerprint(dataframe, columns):
+    """Content hash of ``columns`` (those present), including row order"""
+    cols = [c for c in columns if c in dataframe.columns]
+    if not cols:
+        return f"{len(dataframe)}:empty"
+    hashed = pd.util.hash_pandas_object(dataframe[cols].astype(str), index=False)
+    # Digest of the row hashes in order: the same rows permuted (Supabase
+    # returns them in no fixed order) must not match a snapshot keyed by position
+    return f"{len(dataframe)}:{hashlib.md5(hashed.to_numpy().tobytes()).hexdigest()}"
+
+
+def snapshot_path(name):
+    return os.path.join(SNAPSHOT_DIR, f"{name}.pkl")
+
+
+def keyed_name(name, fingerprint):
+    """Snapshot name of one of several ``name`` objects, told apart by ``fingerprint``"""
+    return f"{name}-{hashlib.md5(fingerprint.encode()).hexdigest()[:12]}"
+
+
+def prune_snapshots(name, keep):
+    """Delete all but the ``keep`` most recently used ``keyed_name`` snapshots of ``name``"""
+    paths = sorted(glob.glob(snapshot_path(f"{name}-*")), key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_snapshot(name, fingerprint):
+    """Stored object for ``name`` if it was built from ``fingerprint``, else None"""
+    path = snapshot_path(name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as fh:
+            stored = pickle.load(fh)
+        if stored.get("fingerprint") == fingerprint:
+            # Mark it as recently used for prune_snapshots
+            os.utime(path)
+            return stored["payload"]
+    except Exception as e:
+        print(f"Snapshot '{name}' could not be read: {e}")
+    return None
+
+
+def save_snapshot(name, fingerprint, payload):
+    """Write atomically so a concurrent reader never sees a half-written file.
+
+    Each writer has its own temporary file, so two threads or processes saving
+    the same snapshot cannot interleave; the last ``os.replace`` wins.
+    """
+    tmp_path = None
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=SNAPSHOT_DIR)
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump({"fingerprint": fingerprint, "payload": payload}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path(name))
+    except Exception as e:
+        print(f"Snapshot '{name}' could not be saved: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
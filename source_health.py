@@ -0,0 +1,151 @@
+"""Health of the remote data source, for failing over to the local data fast.
+
+Without it an outage costs a full HTTP timeout on every load: the client is
+created fine and the page waits inside ``select("*").execute()`` until the
+request gives up, and only then reads the local files. Instead:
+
+- a cheap probe (one row, a few seconds at most) decides whether the source
+  is worth a full read;
+- the verdict is cached: while the source is healthy loads go straight to it,
+  while it is degraded loads skip it and serve the local data at once;
+- a degraded source is re-probed in the background with exponential backoff,
+  and ``on_recover`` is called once it answers again so the dataset can
+  switch back to it.
+"""
+import json
+import threading
+import time
+import urllib.request
+from urllib.parse import quote
+
+HEALTHY = "disponible"
+DEGRADED = "degradado"
+UNKNOWN = "sin comprobar"
+
+
+def postgrest_probe(url, key, table):
+    """Probe that reads one row of ``table`` through PostgREST within ``timeout`` seconds"""
+    endpoint = f"{url.rstrip('/')}/rest/v1/{quote(table)}?select=*&limit=1"
+    headers = {"apikey": key, "Authorization": f"Bearer {key}", "Accept": "application/json"}
+
+    def probe(timeout):
+        request = urllib.request.Request(endpoint, headers=headers)
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            json.loads(response.read() or b"[]")
+    return probe
+
+
+class SourceHealth:
+    """Cached health of one source, with background re-probing while it is degraded.
+
+    ``probe(timeout)`` must raise when the source cannot serve data.
+    ``available()`` never waits longer than one probe, and does not wait at
+    all while the source is known to be degraded.
+    """
+
+    def __init__(self, name, probe, timeout=2.0, fresh_for=60.0, min_backoff=5.0, max_backoff=300.0, on_recover=None):
+        self.name = name
+        self.probe = probe
+        self.timeout = timeout
+        self.fresh_for = fresh_for
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.on_recover = on_recover
+        self.state = UNKNOWN
+        self.failures = 0
+        self.checked_at = None
+        self.degraded_since = None
+        self.retry_at = None
+        self.last_error = None
+        self.last_probe_ms = None
+        self._lock = threading.Lock()
+        self._watching = False
+
+    def available(self):
+        """Whether to read from the source now.
+
+        Healthy and recently confirmed: yes. Degraded: no, until a background
+        probe sees it again. Otherwise one time-boxed probe decides.
+        """
+        if self.state == DEGRADED:
+            return False
+        if self.state == HEALTHY and time.time() - self.checked_at < self.fresh_for:
+            return True
+        return self.check()
+
+    def check(self):
+        """Probe now (at most ``timeout`` seconds) and record the outcome"""
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                self.probe(self.timeout)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            self.last_probe_ms = (time.perf_counter() - started) * 1000
+        if error is None:
+            self.mark_ok()
+            return True
+        self.mark_failed(error)
+        return False
+
+    def mark_ok(self):
+        """The source answered (a probe or a full read)"""
+        recovered = self.state == DEGRADED
+        self.state = HEALTHY
+        self.failures = 0
+        self.checked_at = time.time()
+        self.degraded_since = None
+        self.retry_at = None
+        self.last_error = None
+        if recovered:
+            print(f"Source health: '{self.name}' is back")
+        return recovered
+
+    def mark_failed(self, error):
+        """The source failed (a probe or a full read); back off before trying it again"""
+        self.failures += 1
+        self.checked_at = time.time()
+        self.last_error = str(error) or type(error).__name__
+        if self.state != DEGRADED:
+            self.degraded_since = self.checked_at
+            print(f"Source health: '{self.name}' degraded: {self.last_error}")
+        self.state = DEGRADED
+        self.retry_at = self.checked_at + self.backoff()
+        self._start_watching()
+
+    def backoff(self):
+        return min(self.min_backoff * 2 ** max(self.failures - 1, 0), self.max_backoff)
+
+    def _start_watching(self):
+        with self._lock:
+            if self._watching:
+                return
+            self._watching = True
+        threading.Thread(target=self._watch, name=f"health-{self.name}", daemon=True).start()
+
+    def _watch(self):
+        try:
+            while self.state == DEGRADED:
+                time.sleep(max((self.retry_at or 0) - time.time(), 0))
+                if self.state == DEGRADED and self.check():
+                    if self.on_recover is not None:
+                        self.on_recover(self.name)
+        finally:
+            self._watching = False
+        if self.state == DEGRADED:
+            # Failed again after the loop had seen it recover
+            self._start_watching()
+
+    def describe(self):
+        """One line for the diagnostics panel"""
+        if self.state == HEALTHY:
+            probe = f", sonda {self.last_probe_ms:.0f} ms" if self.last_probe_ms is not None else ""
+            return f"{self.name}: {HEALTHY}{probe}"
+        if self.state == DEGRADED:
+            return (
+                f"{self.name}: {DEGRADED} hace {int(time.time() - self.degraded_since)} s "
+                f"({self.last_error}); nuevo intento en {max(int(self.retry_at - time.time()), 0)} s"
+            )
+        return f"{self.name}: {UNKNOWN}"
@@ -1,7 +1,29 @@
 import streamlit as st
 import pandas as pd
 import os
+import time
 from dotenv import load_dotenv
+import memory_profile
+from gazetteer import attach_coordinates, resolve_city
+from filter_engine import cascade_options, filter_key
+from ai_context import ContextBuilder
+from search_index import load_or_build_index
+from question_router import answer_locally
+from exporter import DISPLAY_RENAMES, EXPORT_FORMATS, export_file, to_display
+from salary_index import SalaryIndex
+from text_features import extract_nbc, extract_proceso
+from dataset_store import DatasetStore
+from change_watch import ChangeFeed, FileWatcher, RealtimeWatcher
+from jobs_model import JobsDataset, single_locations, split_locations
+from dataset_loader import DATA_DIR, LEGACY_FILE, discover_partitions, load_partitions
+from cross_filter import (
+    begin_run, end_run, memory_history, mirror_query_params, on_bar_select, on_map_select,
+    on_sidebar_change, request_rerun, rerun_history, resolve_filter_state, sync_widgets, tracked_fragment
+)
+from ai_jobs import DONE, PENDING, AIJobQueue
+from source_health import DEGRADED, SourceHealth, postgrest_probe
+from bulk_read import read_table
+from result_cache import ResultCache, compute_filter_result
 
 # Page config - MUST BE FIRST
 st.set_page_config(page_title="Empleos DIAN", layout="wide")
@@ -28,7 +50,12 @@ def configure_gemini():
             api_key = st.secrets["GEMINI_API_KEY"]
         
         if api_key and "tu_gemini_api_key_aqui" not in api_key:
-            genai.configure(api_key=api_key)
+            endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+            if endpoint:
+                # Alternative endpoint, e.g. the fake Gemini of loadtest_stub.py
+                genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+            else:
+                genai.configure(api_key=api_key)
             return True, genai
     except Exception as e:
         print(f"Gemini config error: {e}")
@@ -37,23 +64,39 @@ def configure_gemini():
 gemini_enabled, genai_lib = configure_gemini()
 
 
+def supabase_credentials():
+    """``(url, key)`` from the environment or Streamlit secrets, or None if not configured"""
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    
+    if not url and "SUPABASE_URL" in st.secrets:
+        url = st.secrets["SUPABASE_URL"]
+    if not key and "SUPABASE_KEY" in st.secrets:
+        key = st.secrets["SUPABASE_KEY"]
+        
+    if not url or not key or "tu_supabase_url_aqui" in url:
+        return None
+    return url, key
+
+SUPABASE_TABLE = "Empleados Dian"
+# Seconds to open a connection and to read the whole table; probes get PROBE_TIMEOUT
+CONNECT_TIMEOUT = 3
+FETCH_TIMEOUT = 30
+PROBE_TIMEOUT = 2
+
 # Initialize connection
 @st.cache_resource
 def init_connection():
     try:
-        from supabase import create_client
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_KEY")
-        
-        if not url and "SUPABASE_URL" in st.secrets:
-            url = st.secrets["SUPABASE_URL"]
-        if not key and "SUPABASE_KEY" in st.secrets:
-            key = st.secrets["SUPABASE_KEY"]
-            
-        if not url or not key or "tu_supabase_url_aqui" in url:
+        import httpx
+        from supabase import ClientOptions, create_client
+        credentials = supabase_credentials()
+        if credentials is None:
             return None
             
-        return create_client(url, key)
+        # Fail fast on an unreachable host instead of the client's 120 s default
+        options = ClientOptions(postgrest_client_timeout=httpx.Timeout(FETCH_TIMEOUT, connect=CONNECT_TIMEOUT))
+        return create_client(*credentials, options=options)
     except Exception as e:
         print(f"Supabase init error: {e}")
         return None
@@ -61,68 +104,6 @@ def init_connection():
 supabase = init_connection()
 # st.info("Conexiones inicializadas...")
 
-# City Coordinates Mapping (Colombia)
-CITY_COORDINATES = {
-    "Bogotá D.C.": {"lat": 4.7110, "lon": -74.0721},
-    "Medellín": {"lat": 6.2442, "lon": -75.5812},
-    "Cali": {"lat": 3.4516, "lon": -76.5320},
-    "Barranquilla": {"lat": 10.9685, "lon": -74.7813},
-    "Cartagena": {"lat": 10.3910, "lon": -75.4794},
-    "Cartagena De Indias": {"lat": 10.3910, "lon": -75.4794},
-    "Cúcuta": {"lat": 7.8939, "lon": -72.5078},
-    "Bucaramanga": {"lat": 7.1193, "lon": -73.1227},
-    "Pereira": {"lat": 4.8133, "lon": -75.6961},
-    "Santa Marta": {"lat": 11.2408, "lon": -74.1990},
-    "Ibagué": {"lat": 4.4389, "lon": -75.2322},
-    "Villavicencio": {"lat": 4.1420, "lon": -73.6266},
-    "Manizales": {"lat": 5.0703, "lon": -75.5138},
-    "Neiva": {"lat": 2.9273, "lon": -75.2819},
-    "Armenia": {"lat": 4.5339, "lon": -75.6811},
-    "Pasto": {"lat": 1.2136, "lon": -77.2811},
-    "Montería": {"lat": 8.7479, "lon": -75.8814},
-    "Sincelejo": {"lat": 9.3047, "lon": -75.3978},
-    "Popayán": {"lat": 2.4382, "lon": -76.6132},
-    "Tunja": {"lat": 5.5353, "lon": -73.3678},
-    "Riohacha": {"lat": 11.5444, "lon": -72.9072},
-    "Valledupar": {"lat": 10.4631, "lon": -73.2532},
-    "Quibdó": {"lat": 5.6947, "lon": -76.6611},
-    "Florencia": {"lat": 1.6175, "lon": -75.6062},
-    "Yopal": {"lat": 5.3378, "lon": -72.3959},
-    "Arauca": {"lat": 7.0847, "lon": -70.7591},
-    "San Andrés": {"lat": 12.5847, "lon": -81.7006},
-    "Leticia": {"lat": -4.2153, "lon": -69.9406},
-    "Puerto Carreño": {"lat": 6.1890, "lon": -67.4859},
-    "Inírida": {"lat": 3.8653, "lon": -67.9239},
-    "Mitú": {"lat": 1.1983, "lon": -70.1733},
-    "Mocoa": {"lat": 1.1462, "lon": -76.6461},
-    "San José del Guaviare": {"lat": 2.5729, "lon": -72.6378},
-    "Tumaco": {"lat": 1.7986, "lon": -78.8156},
-    "Buenaventura": {"lat": 3.8801, "lon": -77.0312},
-    "Barrancabermeja": {"lat": 7.0653, "lon": -73.8547},
-    "Ipiales": {"lat": 0.8248, "lon": -77.6441},
-    "Palmira": {"lat": 3.5394, "lon": -76.3036},
-    "Tuluá": {"lat": 4.0847, "lon": -76.1969},
-    "Girardot": {"lat": 4.3091, "lon": -74.8016},
-    "Sogamoso": {"lat": 5.7145, "lon": -72.9339},
-    "Duitama": {"lat": 5.8245, "lon": -73.0341},
-    "Puerto Asís": {"lat": 0.5057, "lon": -76.5017},
-    "Ipiales": {"lat": 0.8248, "lon": -77.6441},
-    "Maicao": {"lat": 11.3775, "lon": -72.2415},
-    "Ocaña": {"lat": 8.2372, "lon": -73.3567},
-    "Pamplona": {"lat": 7.3758, "lon": -72.6464},
-    "San Gil": {"lat": 6.5562, "lon": -73.1360},
-    "Túquerres": {"lat": 1.0856, "lon": -77.6083},
-    "Turbo": {"lat": 8.0934, "lon": -76.7275},
-    "Yumbo": {"lat": 3.5855, "lon": -76.4957},
-    "Zipaquirá": {"lat": 5.0264, "lon": -74.0089},
-    "Facatativá": {"lat": 4.8091, "lon": -74.3541},
-    "Fusagasugá": {"lat": 4.3375, "lon": -74.3642},
-    "Girardot": {"lat": 4.3091, "lon": -74.8016},
-    "La Dorada": {"lat": 5.4542, "lon": -74.6614},
-    "Magangué": {"lat": 9.2425, "lon": -74.7547},
-    "Apartadó": {"lat": 7.8829, "lon": -76.6258}
-}
-
 def normalize_city_name(name):
     """Normalize city names to handle encoding issues and formatting variations"""
     if not isinstance(name, str):
@@ -132,40 +113,40 @@ def normalize_city_name(name):
     name = name.strip()
     
     # Handle known corruption patterns manually
-    # The replacement character '\ufffd' might be different vowels
-    if 'Bogot' in name: return "Bogotá D.C."
-    if 'Medell' in name: return "Medellín" 
-    if 'Cucuta' in name or 'C\ufffdcuta' in name or 'C?cuta' in name: return "Cúcuta"
-    if 'Ibagu' in name: return "Ibagué"
-    if 'Monter' in name: return "Montería"
-    if 'Popay' in name: return "Popayán"
-    if 'San Andr' in name: return "San Andrés"
-    if 'Puerto As' in name and 's' in name: return "Puerto Asís"
-    if 'Malaga' in name or 'M\ufffdlaga' in name: return "Málaga"
-    if 'Oca' in name and 'a' in name: return "Ocaña"
+    # The replacement character '\ufffd' might be different vowels.
+    # Repaired names still go through the gazetteer so they get its official name.
+    repaired = None
+    if 'Bogot' in name: repaired = "Bogotá"
+    elif 'Medell' in name: repaired = "Medellín"
+    elif 'Cucuta' in name or 'C\ufffdcuta' in name or 'C?cuta' in name: repaired = "Cúcuta"
+    elif 'Ibagu' in name: repaired = "Ibagué"
+    elif 'Monter' in name: repaired = "Montería"
+    elif 'Popay' in name: repaired = "Popayán"
+    elif 'San Andr' in name: repaired = "San Andrés"
+    elif 'Puerto As' in name and 's' in name: repaired = "Puerto Asís"
+    elif 'Malaga' in name or 'M\ufffdlaga' in name: repaired = "Málaga"
+    elif 'Oca' in name and 'a' in name: repaired = "Ocaña"
+    if repaired:
+        return resolve_city(repaired) or repaired
     
     # General cleanups
     name = name.replace('\ufffd', '') # Remove bad char if not caught above
     name = name.replace('Denominacin', 'Denominación').replace('Descripcin', 'Descripción')
     
-    # Try fuzzy matching or exact matching after cleaning
-    name_lower = name.lower().strip()
-    for city in CITY_COORDINATES.keys():
-        city_lower = city.lower()
-        if city_lower == name_lower: # Exact match
-            return city
-    
-    # Substring match (dangerous but useful for "Cali - Valle")
-    for city in CITY_COORDINATES.keys():
-        city_lower = city.lower()
-        if city_lower in name_lower and len(city) > 4: # Avoid short names like "Cali" matching "Calidad" (unlikely here but safe)
-            return city
+    # Look the cleaned name up in the municipality gazetteer (accent-insensitive)
+    canonical = resolve_city(name)
+    if canonical:
+        return canonical
             
     return name
 
 # Load data
-@st.cache_data(ttl=600)
-def load_data():
+def load_data(years=None, sources=("supabase", "local")):
+    """Jobs from Supabase, or from the local export files for ``years`` (None = all).
+
+    Returns a ``JobsDataset`` (jobs plus their city locations);
+    ``attrs["fuente"]`` says which of ``sources`` answered.
+    """
     # Helper to process/normalize dataframe
     def process_dataframe(df_input):
         # Map columns if they come from Supabase (Spanish names)
@@ -197,187 +178,109 @@ def load_data():
              else:
                  df_input['salario'] = 0
 
-        # Extract process from 'descripcion' if available
+        # Ficha (proceso) and NBC (Núcleo Básico de Conocimiento) features are
+        # parsed once per distinct text, before the city explode, and stored as
+        # categorical codes
         if 'descripcion' in df_input.columns:
-            def extract_proceso(val):
-                if not isinstance(val, str):
-                    return "Desconocido"
-                # Look for pattern like XX-XX-XXXX at start
-                import re
-                # User wants first 4 letters with hyphen: IT-IT
-                match = re.search(r'^([A-Z]{2}-[A-Z]{2})', val)
-                if match:
-                    return match.group(1)
-                
-                # Fallback: simple split
-                parts = val.split('-')
-                if len(parts) > 1 and len(parts[0].strip()) == 2 and len(parts[1].strip()) == 2:
-                    return f"{parts[0].strip()}-{parts[1].strip()}"
-                
-                return "Otros"
-            
-            df_input['proceso'] = df_input['descripcion'].apply(extract_proceso)
+            df_input['proceso'] = extract_proceso(df_input['descripcion'])
         elif 'proceso' not in df_input.columns:
             df_input['proceso'] = "Desconocido"
 
-        # Extract 'NBC' (Núcleo Básico de Conocimiento) from 'estudio' if available
         if 'estudio' in df_input.columns:
-            def extract_nbc(val):
-                if not isinstance(val, str):
-                    return []
-                # Pattern: "NBC: PROFESION"
-                # Normalize spaces
-                val = val.replace('\n', ' ').strip()
-                parts = val.split("NBC:")
-                extracted = []
-                for part in parts[1:]:
-                    # Clean up each part, stopping at separators like " ,O,"
-                    clean_part = part.strip().split(" ,O,")[0]
-                    # Also strip common trailing chars
-                    clean_part = clean_part.strip(" .")
-                    if clean_part:
-                        extracted.append(clean_part)
-                return list(set(extracted))
-            
-            df_input['estudios_parsed'] = df_input['estudio'].apply(extract_nbc)
+            df_input['estudios_nbc'] = extract_nbc(df_input['estudio'])
         else:
-            df_input['estudios_parsed'] = df_input.apply(lambda x: [], axis=1)
-
-        # Extract city and vacancy count from 'Vacantes' or 'ciudad_raw'
-        if 'ciudad' not in df_input.columns:
-            if 'ciudad_raw' in df_input.columns:
-                # Explode the dataframe to handle multiple cities per row
-                # Format: "3 - Armenia..., 4 - Cali..." separated by commas
-                df_input['ciudad_raw'] = df_input['ciudad_raw'].astype(str).str.split(',')
-                df_input = df_input.explode('ciudad_raw')
-                df_input['ciudad_raw'] = df_input['ciudad_raw'].str.strip()
-
-                # Format usually: "2 - Bogotá D.C. - DONDE SE UBIQUE..."
-                def extract_info(val):
-                    city = "Desconocido"
-                    vacancies = 1
-                    
-                    if isinstance(val, str):
-                        # Fix encoding in raw string if present before split
-                        # Fix encoding in raw string if present before split
-                        val = val.replace('\ufffd', '')
-                        
-                        parts = val.split(' - ')
-                        # Try to extract vacancies count from first part
-                        try:
-                            if len(parts) > 0:
-                                vacancies = int(parts[0].strip())
-                        except ValueError:
-                            pass
-                        
-                        # Try to extract city from second part
-                        if len(parts) >= 2:
-                            city = normalize_city_name(parts[1].strip())
-                            
-                    return pd.Series([city, vacancies])
-                
-                df_input[['ciudad', 'vacantes_count']] = df_input['ciudad_raw'].apply(extract_info)
-            else:
-                df_input['ciudad'] = "Desconocido"
-                df_input['vacantes_count'] = 1
+            df_input['estudios_nbc'] = extract_nbc(pd.Series([None] * len(df_input), index=df_input.index, dtype=object))
 
         # Ensure numeric salary
         if 'salario' in df_input.columns:
             df_input['salario'] = pd.to_numeric(df_input['salario'], errors='coerce').fillna(0)
+
+        # CSV reads (bulk_read) give every column as text; OPECs are numbers
+        # in the Excel exports and the JSON rows, unless some are not numeric
+        if 'opec' in df_input.columns:
+            opec = pd.to_numeric(df_input['opec'], errors='coerce')
+            if opec.notna().all():
+                df_input['opec'] = opec.astype('int64')
+
+        # Split into one row per job and one row per (job, city) location,
+        # instead of exploding the job texts onto every city
+        columns = list(df_input.columns)
+        if 'ciudad' not in df_input.columns and 'ciudad_raw' in df_input.columns:
+            # Format: "3 - Armenia..., 4 - Cali..." separated by commas,
+            # each entry usually "2 - Bogotá D.C. - DONDE SE UBIQUE..."
+            def extract_info(val):
+                city = "Desconocido"
+                vacancies = 1
+                
+                # Fix encoding in raw string if present before split
+                val = val.replace('\ufffd', '')
+                
+                parts = val.split(' - ')
+                # Try to extract vacancies count from first part
+                try:
+                    if len(parts) > 0:
+                        vacancies = int(parts[0].strip())
+                except ValueError:
+                    pass
+                
+                # Try to extract city from second part
+                if len(parts) >= 2:
+                    city = normalize_city_name(parts[1].strip())
+                        
+                return city, vacancies
+
+            jobs, locations = split_locations(df_input, extract_info)
+        else:
+            if 'ciudad' not in df_input.columns:
+                df_input['ciudad'] = "Desconocido"
+                df_input['vacantes_count'] = 1
+                columns = list(df_input.columns)
+            jobs, locations = single_locations(df_input)
             
         # Map cities to coordinates
-        def get_lat(city):
-            return CITY_COORDINATES.get(city, {}).get("lat", None)
-        
-        def get_lon(city):
-            return CITY_COORDINATES.get(city, {}).get("lon", None)
-
-        df_input['latitud'] = df_input['ciudad'].apply(get_lat)
-        df_input['longitud'] = df_input['ciudad'].apply(get_lon)
+        locations = attach_coordinates(locations, 'ciudad')
+        columns += [c for c in locations.columns if c not in columns and c != 'job_id']
             
-        return df_input
+        return JobsDataset(jobs, locations, columns)
 
-    # Try Supabase first
+    # Try Supabase first, unless it is known to be down or does not answer a quick probe
+    health = get_source_health()
     try:
-        if supabase:
-            response = supabase.table("Empleados Dian").select("*").execute()
-            df = pd.DataFrame(response.data)
+        if supabase and "supabase" in sources and (health is None or health.available()):
+            try:
+                # CSV parsed into text columns; JSON rows if the backend has no CSV
+                df, wire_format = read_table(supabase, SUPABASE_TABLE)
+            except Exception as e:
+                if health is not None:
+                    health.mark_failed(e)
+                raise
+            if health is not None:
+                health.mark_ok()
+            print(f"Read {len(df)} rows from Supabase as {wire_format}")
             if not df.empty:
-                return process_dataframe(df)
+                df = process_dataframe(df)
+                df.attrs["fuente"] = "supabase"
+                return df
     except Exception as e:
         # Log error to console but don't show to user unless debugging
         print(f"Supabase connection failed: {e}")
     
-    # Fallback to local file
+    # Fallback to the local export files (one partition per file and year)
     try:
-        # Use absolute path for cloud stability
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        local_file = os.path.join(base_path, "EmpleosDIAN_2025.xlsx")
-        
-        if os.path.exists(local_file):
-            print(f"Loading local file: {local_file}")
-            df = pd.read_excel(local_file)
-            
-            # Helper to find col by keyword
-            def get_col(keywords, exclude=None):
-                for col in df.columns:
-                    if any(k in col.lower() for k in keywords):
-                        if exclude and any(e in col.lower() for e in exclude):
-                            continue
-                        return col
-                return None
-
-            cargo_col = get_col(['denominac', 'cargo'])
-            salario_col = get_col(['asignaci', 'salarial', 'sueldo'])
-            # Exclude 'cantidad' to avoid picking 'Cantidad de Vacantes'
-            ciudad_col = get_col(['vacantes', 'ubicacion', 'ciudad'], exclude=['cantidad'])
-            categoria_col = get_col(['categoria', 'categor'])
-            convocatoria_col = get_col(['convocatoria'])
-
-            # --- FILTER: Keep only "Ingreso" (Open) processes ---
-            if convocatoria_col:
-                # Filter rows where convocatoria contains 'Ingreso' (case insensitive)
-                # Drop NA values first to avoid errors
-                df = df.dropna(subset=[convocatoria_col])
-                df = df[df[convocatoria_col].astype(str).str.contains('Ingreso', case=False, na=False)]
-                print(f"Filtered to keep only 'Ingreso' processes. Remaining rows: {len(df)}")
-            # ----------------------------------------------------
-            descripcion_col = get_col(['descripci'])
-            estudio_col = get_col(['estudio'])
-            experiencia_col = get_col(['experiencia'])
-            opec_col = get_col(['opec'])
-            grado_col = get_col(['grado'])
-            codigo_empleo_col = get_col(['código empleo', 'codigo empleo'])
-            
-            new_df = pd.DataFrame()
-            if cargo_col: new_df['cargo'] = df[cargo_col]
-            if salario_col: new_df['salario'] = df[salario_col]
-            if ciudad_col: 
-                new_df['ciudad_raw'] = df[ciudad_col]
-            if categoria_col:
-                new_df['categoria'] = df[categoria_col]
-            if convocatoria_col:
-                new_df['convocatoria'] = df[convocatoria_col]
-            if descripcion_col:
-                new_df['descripcion'] = df[descripcion_col]
-            if estudio_col:
-                new_df['estudio'] = df[estudio_col]
-            if experiencia_col:
-                new_df['experiencia'] = df[experiencia_col]
-            if opec_col:
-                new_df['opec'] = df[opec_col]
-            if grado_col:
-                new_df['grado'] = df[grado_col]
-            if codigo_empleo_col:
-                new_df['codigo_empleo'] = df[codigo_empleo_col]
+        partitions = discover_partitions() if "local" in sources else []
+        if partitions:
+            # Keep only "Ingreso" (Open) processes; files known to have none are not read
+            new_df = load_partitions(partitions, years=years, convocatoria_keyword="Ingreso")
             
             # Process the dataframe to extract city, vacancies and coords
-            print(f"Successfully loaded {len(new_df)} rows from local file")
-            return process_dataframe(new_df)
-        else:
-            print(f"ERROR: Local file not found: {local_file}")
+            print(f"Successfully loaded {len(new_df)} rows from {len(partitions)} local files")
+            if not new_df.empty:
+                new_df = process_dataframe(new_df)
+                new_df.attrs["fuente"] = "local"
+                return new_df
+        elif "local" in sources:
+            print(f"ERROR: No local export files found in {DATA_DIR} or {LEGACY_FILE}")
             print(f"Current directory: {os.getcwd()}")
-            print(f"Files in directory: {os.listdir('.')}")
             
     except Exception as e:
         # Log to console instead of showing error to user
@@ -385,18 +288,103 @@ def load_data():
         import traceback
         traceback.print_exc()
     
-    # Return empty DataFrame if all else fails
-    print("WARNING: Returning empty DataFrame - no data source available")
-    return pd.DataFrame()
+    # Return an empty dataset if all else fails
+    print("WARNING: Returning empty dataset - no data source available")
+    return JobsDataset.empty_dataset()
+
+@st.cache_resource
+def get_source_health():
+    """Cached Supabase health; when it comes back after an outage the datasets reload from it"""
+    try:
+        credentials = supabase_credentials()
+    except Exception:
+        credentials = None
+    if credentials is None or supabase is None:
+        return None
+    url, key = credentials
+    # Recovery goes through the change feed like any other Supabase change
+    return SourceHealth(
+        "supabase", postgrest_probe(url, key, SUPABASE_TABLE), timeout=PROBE_TIMEOUT,
+        on_recover=get_change_feed().notify,
+    )
+
+@st.cache_resource
+def get_change_feed():
+    """Change notifications from Supabase Realtime and the local export files"""
+    feed = ChangeFeed(quiet_period=5.0)
+    feed.add_watcher("local", FileWatcher(
+        lambda: [partition.path for partition in discover_partitions()], feed.notify, interval=5.0
+    ))
+    try:
+        credentials = supabase_credentials()
+    except Exception:
+        credentials = None
+    if credentials is not None and supabase is not None:
+        url, key = credentials
+        # Alternative Realtime endpoint, e.g. the stand-in of loadtest_stub.py
+        realtime_url = os.environ.get("SUPABASE_REALTIME_URL") or f"{url.rstrip('/')}/realtime/v1"
+        feed.add_watcher("supabase", RealtimeWatcher(realtime_url, key, SUPABASE_TABLE, feed.notify))
+    return feed
+
+# A few year selections at once; an evicted store stops following the change feed
+@st.cache_resource(max_entries=4, on_release=DatasetStore.close)
+def get_dataset_store(years):
+    """Process-wide dataset for ``years``.
+
+    Reloaded in the background when its source reports a change, and every
+    10 minutes when changes are not being pushed (every 6 hours when they are).
+    """
+    def loader(previous):
+        # Once Supabase data is being served, a failed refresh keeps it rather
+        # than replacing it with a cold parse of the local files
+        if previous is not None and previous.source == "supabase":
+            return load_data(years, sources=("supabase",))
+        return load_data(years)
+    return DatasetStore(loader, refresh_interval=600, change_feed=get_change_feed())
+
+@st.cache_resource(max_entries=2)
+def get_search_index(_jobs, dataset_key):
+    """Full-text index over the jobs table, reused from the on-disk snapshot if unchanged"""
+    return load_or_build_index(_jobs)
+
+# Job columns with a precomputed salary distribution in the salary panel
+SALARY_GROUPS = ["categoria", "convocatoria", "proceso", "cargo"]
+
+@st.cache_resource(max_entries=2)
+def get_salary_index(_jobs, dataset_key):
+    """Sorted salaries for range filtering, plus salary quantiles/histograms per group"""
+    groups = {col: _jobs[col] for col in SALARY_GROUPS if col in _jobs.columns}
+    return SalaryIndex(_jobs["salario"], groups)
 
 # Layout
 st.title("Dashboard de Empleos DIAN")
 
-# Load data
-df = load_data()
+# Load data, reading only the export files for the selected years
+available_years = sorted({partition.anio for partition in discover_partitions()})
+selected_years = None
+if len(available_years) > 1:
+    with st.sidebar:
+        selected_years = tuple(st.multiselect(
+            "Año", available_years, default=available_years, key="year_filter_widget",
+            help="Solo se cargan los archivos de los años seleccionados."
+        )) or None
+dataset = get_dataset_store(selected_years).get()
+data = dataset.data
+if not data.empty:
+    # Build (or load) the search index together with the data, not on the first query
+    get_search_index(data.jobs, dataset.version)
+    get_salary_index(data.jobs, dataset.version)
 
 # Show offline indicator if applicable
-if 'supabase' not in globals() or supabase is None:
+source_health = get_source_health()
+if source_health is not None and source_health.state == DEGRADED and dataset.source != "supabase":
+    st.markdown("""
+        <div style="background-color: #f0f2f6; padding: 0.5rem; border-radius: 0.5rem; margin-bottom: 1rem; border-left: 5px solid #ffa500;">
+            <span style="color: #555; font-weight: bold;">⚠️ Base de datos sin respuesta:</span>
+            <span style="color: #666;"> Se están mostrando datos locales. El tablero volverá a la base de datos en cuanto responda.</span>
+        </div>
+    """, unsafe_allow_html=True)
+elif 'supabase' not in globals() or supabase is None:
     st.markdown("""
         <div style="background-color: #f0f2f6; padding: 0.5rem; border-radius: 0.5rem; margin-bottom: 1rem; border-left: 5px solid #ffa500;">
             <span style="color: #555; font-weight: bold;">⚠️ Modo Offline:</span>
@@ -405,20 +393,17 @@ if 'supabase' not in globals() or supabase is None:
     """, unsafe_allow_html=True)
 
 # Gemini Assistant Functions
-def generate_data_summary(dataframe):
-    """Generate a summary of the employment data using Gemini"""
-    if not gemini_enabled or dataframe.empty:
-        return None
+def summary_prompt(dataframe):
+    """Gemini prompt summarizing the (filtered) employment data"""
+    # Prepare data context
+    total_jobs = len(dataframe)
+    total_vacancies = dataframe['vacantes_count'].sum() if 'vacantes_count' in dataframe.columns else total_jobs
+    cities = dataframe['ciudad'].value_counts().head(20) # Increased context
+    cities = cities[cities > 0].to_dict()
+    top_positions = dataframe['cargo'].value_counts().head(20).to_dict() # Increased context
+    avg_salary = dataframe['salario'].mean()
     
-    try:
-        # Prepare data context
-        total_jobs = len(dataframe)
-        total_vacancies = dataframe['vacantes_count'].sum() if 'vacantes_count' in dataframe.columns else total_jobs
-        cities = dataframe['ciudad'].value_counts().head(20).to_dict() # Increased context
-        top_positions = dataframe['cargo'].value_counts().head(20).to_dict() # Increased context
-        avg_salary = dataframe['salario'].mean()
-        
-        prompt = f"""Analiza estos datos de empleos de la DIAN en Colombia y genera un resumen ejecutivo detallado en español:
+    return f"""Analiza estos datos de empleos de la DIAN en Colombia y genera un resumen ejecutivo detallado en español:
         
 - Total de empleos (registros): {total_jobs}
 - Total de vacantes: {total_vacancies}
@@ -428,57 +413,61 @@ def generate_data_summary(dataframe):
 
 Incluye insights profundos sobre patrones geográficos, distribución de cargos, disparidades salariales y cualquier tendencia notable. No limites la longitud de tu respuesta, sé exhaustivo."""
 
-        # Try multiple models in order of preference based on available models
-        models_to_try = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-2.0-flash-exp']
-        response = None
-        errors = []
-        
-        for model_name in models_to_try:
-            try:
-                model = genai_lib.GenerativeModel(model_name)
-                response = model.generate_content(prompt)
-                break # If successful, exit loop
-            except Exception as e:
-                errors.append(f"{model_name}: {str(e)}")
-                continue
-                
-        if response:
-            return response.text
-        else:
-            error_msg = "\n".join(errors)
-            st.error(f"Error generando resumen. Detalles técnicos:\n{error_msg}")
-            return None
-    except Exception as e:
-        st.error(f"Error general: {e}")
-        return None
+def generate_data_summary(prompt):
+    """Run a ``summary_prompt`` through Gemini.
+
+    Runs on the AI job pool, outside the script thread, so it reports
+    failures by raising instead of drawing errors on the page.
+    """
+    # Try multiple models in order of preference based on available models
+    models_to_try = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-2.0-flash-exp']
+    response = None
+    errors = []
+    
+    for model_name in models_to_try:
+        try:
+            model = genai_lib.GenerativeModel(model_name)
+            response = model.generate_content(prompt)
+            break # If successful, exit loop
+        except Exception as e:
+            errors.append(f"{model_name}: {str(e)}")
+            continue
+            
+    if response:
+        return response.text
+    error_msg = "\n".join(errors)
+    raise RuntimeError(f"No se pudo obtener respuesta. Detalles técnicos:\n{error_msg}")
 
-def chat_with_data(user_question, dataframe):
-    """Answer questions about the employment data using Gemini"""
+@st.cache_resource
+def get_ai_jobs():
+    """Background pool for Gemini summaries, shared by all sessions"""
+    return AIJobQueue(max_workers=3, max_pending=12)
+
+@st.cache_resource
+def get_result_cache():
+    """Filtered rows and aggregates per dataset version and filter state, shared by all sessions"""
+    return ResultCache(max_bytes=64 * 1024 * 1024)
+
+@st.cache_resource(max_entries=2)
+def get_context_builder(_data, dataset_key):
+    """Digest for the assistant, ranking jobs on the search box's index; once per dataset version"""
+    return ContextBuilder(_data.wide(), jobs=_data.jobs, index=get_search_index(_data.jobs, dataset_key))
+
+def chat_with_data(user_question, dataframe, full_data):
+    """Answer questions about the (filtered) employment data using Gemini"""
     if not gemini_enabled or dataframe.empty:
         return "El asistente de IA no está configurado. Agrega tu GEMINI_API_KEY al archivo .env"
     
     try:
-        # Prepare data context - Increased limits for Pro model
-        unique_cities = dataframe['ciudad'].unique().tolist()
-        unique_cargos = dataframe['cargo'].unique().tolist()
-        
-        # If lists are too long, we still truncate but much less than before
-        cities_str = str(unique_cities[:100]) + ("..." if len(unique_cities) > 100 else "")
-        cargos_str = str(unique_cargos[:100]) + ("..." if len(unique_cargos) > 100 else "")
-        
-        data_summary = f"""Datos de empleos DIAN disponibles:
-- Total registros: {len(dataframe)}
-- Total vacantes: {dataframe['vacantes_count'].sum() if 'vacantes_count' in dataframe.columns else 'N/A'}
-- Ciudades disponibles: {cities_str}
-- Cargos disponibles: {cargos_str}
-- Rango salarial: ${dataframe['salario'].min():,.0f} - ${dataframe['salario'].max():,.0f}
-"""
+        # Only the aggregates and rows relevant to the question, within a token budget
+        builder = get_context_builder(full_data, dataset.version)
+        data_summary = builder.build(user_question, dataframe)
         
         prompt = f"""{data_summary}
 
 Pregunta del usuario: {user_question}
 
-Responde la pregunta en español de forma completa y detallada basándote en los datos disponibles. Si la respuesta requiere una lista larga, proporciónala."""
+Responde la pregunta en español de forma completa y detallada basándote en los datos disponibles. Si la respuesta requiere una lista larga, proporciónala. Los datos ya reflejan los filtros que el usuario tiene activos en el tablero."""
 
         # Try multiple models in order of preference based on available models
         models_to_try = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-2.0-flash-exp']
@@ -502,219 +491,342 @@ Responde la pregunta en español de forma completa y detallada basándote en los
     except Exception as e:
         return f"Error: {e}"
 
-if not df.empty:
-    # Handle Map Selection State
-    # Check if a selection was made on the map (available in session state from previous run)
-    if "map_selection" in st.session_state:
-        selection = st.session_state.map_selection
-        
-        # Extract the currently selected city from the map selection
-        current_map_city = None
-        if selection and "selection" in selection and "points" in selection["selection"]:
-            points = selection["selection"]["points"]
-            if points:
-                current_map_city = points[0]["hovertext"]
-        
-        # Initialize last_processed_map_city if not present
-        if "last_processed_map_city" not in st.session_state:
-            st.session_state.last_processed_map_city = None
+@tracked_fragment("asistente")
+def render_assistant(data, positions):
+    """Sidebar AI assistant panel; reruns on its own when a question is asked.
 
-        # Check if the extracted city has changed compared to what we last processed
-        if current_map_city != st.session_state.last_processed_map_city:
-            st.session_state.last_processed_map_city = current_map_city
-            
-            # Only update the widget if we have a valid city selection
-            if current_map_city is not None:
-                st.session_state.city_filter_widget = [current_map_city]
-                st.rerun()
+    The filtered rows are only joined into a wide frame when a question is asked.
+    """
+    st.divider()
+    st.header("🤖 Asistente IA")
+    
+    if gemini_enabled:
+        st.success("✅ Gemini activado")
+    else:
+        st.warning("⚠️ Gemini no configurado")
+        st.caption("Agrega tu GEMINI_API_KEY al archivo .env para activar el asistente de IA. Las preguntas de conteo, salario y ranking se responden igual con los datos locales.")
+        
+    # Chat interface
+    user_question = st.text_area(
+        "Hazle una pregunta a la IA sobre los datos:",
+        placeholder="Ej: ¿Cuál es el cargo mejor pagado en Bogotá?",
+        height=100
+    )
+    
+    if st.button("Preguntar", use_container_width=True):
+        if user_question.strip():
+            routing = st.session_state.setdefault("question_routing", {"local": 0, "gemini": 0})
+            filtered_df = data.wide(positions)
+            # Aggregate, ranking and lookup questions are answered from the data directly
+            local_answer = answer_locally(user_question, filtered_df)
+            if local_answer:
+                routing["local"] += 1
+                st.info(local_answer[1])
+                st.caption("⚡ Respondido directamente con los datos filtrados")
+            elif gemini_enabled:
+                routing["gemini"] += 1
+                print("Question router: sending open-ended question to Gemini")
+                with st.spinner("Analizando..."):
+                    answer = chat_with_data(user_question, filtered_df, data)
+                    st.info(answer)
+            else:
+                st.warning("Esta pregunta necesita el asistente de Gemini, que no está configurado.")
+        else:
+            st.warning("Por favor escribe una pregunta")
 
-    # Sidebar Filters
+    routing = st.session_state.get("question_routing")
+    if routing:
+        st.caption(f"Preguntas respondidas localmente: {routing['local']} · con Gemini: {routing['gemini']}")
 
-    with st.sidebar:
-        st.header("Filtros")
-        
-        # --- Dynamic Filters ---
-        # Filters are applied sequentially to narrow down options
-        
-        # 1. City Filter (Top Level)
-        cities = sorted(df["ciudad"].dropna().unique())
-        selected_cities = st.multiselect("Seleccionar Ciudad", cities, key="city_filter_widget")
-        
-        # Filter data for calculating next level filter options
-        df_opt_context = df.copy()
-        if selected_cities:
-            df_opt_context = df_opt_context[df_opt_context["ciudad"].isin(selected_cities)]
-
-        # 2. Category Filter
-        if 'categoria' in df.columns and not df_opt_context.empty:
-            categorias = sorted(df_opt_context["categoria"].dropna().unique())
-            selected_categorias = st.multiselect("Seleccionar Categoría", categorias)
-            if selected_categorias:
-                df_opt_context = df_opt_context[df_opt_context["categoria"].isin(selected_categorias)]
-        else:
-            selected_categorias = None
-            
-        # 3. Convocatoria Filter
-        if 'convocatoria' in df.columns and not df_opt_context.empty:
-            convocatorias = sorted(df_opt_context["convocatoria"].dropna().unique())
-            selected_convocatoria = st.multiselect("Seleccionar Convocatoria", convocatorias)
-            if selected_convocatoria:
-                 df_opt_context = df_opt_context[df_opt_context["convocatoria"].isin(selected_convocatoria)]
-        else:
-            selected_convocatoria = None
-
-        # 4. Ficha (Proceso) Filter
-        if 'proceso' in df.columns and not df_opt_context.empty:
-            procesos = sorted(df_opt_context["proceso"].dropna().unique())
-            selected_procesos = st.multiselect("Filtrar por Ficha", procesos)
-            if selected_procesos:
-                df_opt_context = df_opt_context[df_opt_context["proceso"].isin(selected_procesos)]
-        else:
-            selected_procesos = None
-            
-        # 5. Study Filter
-        if 'estudios_parsed' in df.columns and not df_opt_context.empty:
-            # Flatten list of lists to get unique values from the CURRENT context
-            current_nbcs = sorted(list(set([item for sublist in df_opt_context['estudios_parsed'] for item in sublist])))
-            selected_estudios = st.multiselect("Filtrar por Estudio", current_nbcs)
-        else:
-            selected_estudios = None
-        
-        # Salary Filter
-        min_salary = int(df["salario"].min())
-        max_salary = int(df["salario"].max())
-        selected_salary = st.slider("Rango de Salario", min_salary, max_salary, (min_salary, max_salary))
-        
-        # AI Assistant
-        st.divider()
-        st.header("🤖 Asistente IA")
-        
-        if gemini_enabled:
-            st.success("✅ Gemini activado")
-            
-            # Chat interface
-            user_question = st.text_area(
-                "Hazle una pregunta a la IA sobre los datos:",
-                placeholder="Ej: ¿Cuál es el cargo mejor pagado en Bogotá?",
-                height=100
-            )
-            
-            if st.button("Preguntar", use_container_width=True):
-                if user_question.strip():
-                    with st.spinner("Analizando..."):
-                        answer = chat_with_data(user_question, df)
-                        st.info(answer)
-                else:
-                    st.warning("Por favor escribe una pregunta")
+    with st.expander("🛠️ Diagnóstico de Conexión IA"):
+        if st.button("Listar Modelos Disponibles"):
+            try:
+                import google.generativeai as genai_internal
+                models = list(genai_internal.list_models())
+                model_names = [m.name for m in models]
+                st.write("Modelos encontrados:", model_names)
+            except Exception as e:
+                st.error(f"Error listando modelos: {e}")
+
+
+@st.fragment(run_every=2)
+def poll_summary(job_key):
+    """Checks a running summary every 2 s; one app run shows it once it is ready"""
+    job = get_ai_jobs().get(job_key)
+    if job is not None and job.status == PENDING:
+        st.info(f"⏳ Generando análisis con IA... ({job.elapsed:.0f} s). Puedes seguir usando el tablero mientras tanto.")
+    else:
+        request_rerun()
+
+
+@tracked_fragment("resumen")
+def render_summary(data, positions, job_key):
+    """AI summary expander; the button reruns only this fragment.
+
+    The summary is generated on the shared AI job pool, keyed by ``job_key``
+    (dataset version and filter state): the page never waits for Gemini, and
+    users with the same filters share one request and its result.
+    """
+    ai_jobs = get_ai_jobs()
+    with st.expander("📊 Resumen Generado por IA", expanded=True):
+        job = ai_jobs.get(job_key)
+        running = job is not None and job.status == PENDING
+        if st.button("🔄 Generar Resumen con Gemini", use_container_width=True, disabled=running or len(positions) == 0):
+            job = ai_jobs.submit(job_key, generate_data_summary, summary_prompt(data.wide(positions)))
+            if job is None:
+                st.warning("Hay demasiados resúmenes en curso. Intenta de nuevo en unos segundos.")
+
+        if job is None:
+            return
+        if job.status == PENDING:
+            poll_summary(job_key)
+        elif job.status == DONE:
+            st.markdown(job.result)
+            st.caption(f"Resumen de los filtros actuales, generado en {job.elapsed:.0f} s.")
         else:
-            st.warning("⚠️ Gemini no configurado")
-            st.caption("Agrega tu GEMINI_API_KEY al archivo .env para activar el asistente de IA")
+            st.error(f"Error generando resumen. {job.error}")
 
-        with st.expander("🛠️ Diagnóstico de Conexión IA"):
-            if st.button("Listar Modelos Disponibles"):
-                try:
-                    import google.generativeai as genai_internal
-                    models = list(genai_internal.list_models())
-                    model_names = [m.name for m in models]
-                    st.write("Modelos encontrados:", model_names)
-                except Exception as e:
-                    st.error(f"Error listando modelos: {e}")
-
-    # Final Boolean Masking (Empty Filter = Show All)
-    mask = (df["salario"] >= selected_salary[0]) & (df["salario"] <= selected_salary[1])
-    
-    if selected_cities:
-        mask &= df["ciudad"].isin(selected_cities)
+
+@tracked_fragment("cargos")
+def render_cargo_section(data, positions, breakdowns):
+    """Bar chart by cargo, the other breakdowns and the detail table.
+
+    Depends only on the filtered rows from the last full run and the bar
+    selection stored by on_bar_select, so a bar click reruns just this fragment.
+    ``positions`` are the filtered location rows of ``data`` and
+    ``breakdowns`` the cached top values among them per column; job columns
+    are joined only for the table and, chunk by chunk, for the export.
+    """
+    memory_profile.stage("cargos")
+    selected_cargo = st.session_state.get("bar_selection_cargo")
+
+    # Bar Chart
+    st.subheader("Empleos por Cargo")
     
-    if selected_categorias and 'categoria' in df.columns:
-        mask &= df["categoria"].isin(selected_categorias)
+    if len(positions):
+        import plotly.express as px
+        # Prepare data for Plotly
+        jobs_by_cargo = breakdowns["cargo"].reset_index()
+        jobs_by_cargo.columns = ["cargo", "count"]
+        
+        # Create interactive bar chart
+        fig_bar = px.bar(
+            jobs_by_cargo, 
+            x="cargo", 
+            y="count",
+            labels={"cargo": "Cargo", "count": "Cantidad de Vacantes"},
+            color="count",
+            color_continuous_scale='Viridis'
+        )
         
-    if selected_convocatoria and 'convocatoria' in df.columns:
-        mask &= df["convocatoria"].isin(selected_convocatoria)
+        # Update layout for better UX
+        fig_bar.update_layout(
+            clickmode='event+select',
+            xaxis_tickangle=-45,
+            margin=dict(b=100) # Give space for labels
+        )
         
-    if selected_procesos and 'proceso' in df.columns:
-        mask &= df["proceso"].isin(selected_procesos)
+        # Display chart with selection enabled; on_bar_select stores the cargo
+        # before the run, so the table below is already filtered in this run
+        selected_bar = st.plotly_chart(fig_bar, use_container_width=True, on_select=on_bar_select, key="bar_selection")
         
-    if selected_estudios and 'estudios_parsed' in df.columns:
-        # For list columns, check if any element matches
-        mask &= df["estudios_parsed"].apply(lambda x: any(item in selected_estudios for item in x))
+        points = []
+        if selected_bar and "selection" in selected_bar and "points" in selected_bar["selection"]:
+            points = selected_bar["selection"]["points"]
+        if points and selected_cargo:
+            st.info(f"Filtrando por cargo: {selected_cargo}")
+        else:
+            # The chart dropped its selection (e.g. the figure changed with the filters)
+            st.session_state.bar_selection_cargo = None
+            selected_cargo = None
+
+        # Same counts for the other grouping columns, computed with the cargo ones
+        others = {column: top for column, top in breakdowns.items() if column != "cargo" and not top.empty}
+        if others:
+            with st.expander("📊 Empleos por Categoría, Ficha y Estudio"):
+                titles = {"estudios_nbc": "Estudio (NBC)"}
+                tabs = st.tabs([titles.get(column, DISPLAY_RENAMES.get(column, column)) for column in others])
+                for tab, top in zip(tabs, others.values()):
+                    with tab:
+                        st.bar_chart(top, horizontal=True)
 
-    filtered_df = df[mask]
+    else:
+        st.info("No hay datos para mostrar con los filtros seleccionados.")
+
+    # Apply Bar Chart Filter to the rows behind the table and the export (integer code compare)
+    if selected_cargo:
+        positions = data.select(positions, "cargo", selected_cargo)
 
-    # Create map data (ignores city filter to allow selection)
-    map_mask = (df["salario"] >= selected_salary[0]) & (df["salario"] <= selected_salary[1])
+    # Dataframe
+    memory_profile.stage("tabla")
+    st.subheader("Detalle de Empleos")
     
-    if selected_categorias and 'categoria' in df.columns:
-        map_mask &= df["categoria"].isin(selected_categorias)
+    # Prepare dataframe for display (internal columns hidden, display names)
+    display_df = to_display(data.wide(positions))
+    st.dataframe(display_df, use_container_width=True)
+
+    # Export the rows behind the table; the file is only built when the button is clicked
+    col_format, col_download = st.columns([1, 2])
+    with col_format:
+        export_format = st.selectbox("Formato", list(EXPORT_FORMATS), key="export_format", label_visibility="collapsed")
+    with col_download:
+        extension, mime = EXPORT_FORMATS[export_format]
+        st.download_button(
+            f"⬇️ Descargar {len(positions)} filas ({export_format})",
+            data=lambda: export_file(data, positions, export_format),
+            file_name=f"empleos_dian.{extension}",
+            mime=mime,
+            on_click="ignore",
+            disabled=len(positions) == 0,
+        )
+
+
+@tracked_fragment("salarios")
+def render_salary_panel(salary_index):
+    """Salary quantiles and histogram per group, read from the precomputed salary index"""
+    groups = [col for col in SALARY_GROUPS if col in salary_index.tables]
+    if not groups:
+        return
+    with st.expander("💰 Distribución de Salarios"):
+        col_group, col_value = st.columns(2)
+        with col_group:
+            column = st.selectbox(
+                "Agrupar por", groups, format_func=lambda col: DISPLAY_RENAMES.get(col, col), key="salary_panel_group"
+            )
+        table = salary_index.quantile_table(column)
+        with col_value:
+            group = st.selectbox("Histograma de", list(table.index), key="salary_panel_value")
+
+        import plotly.express as px
+        histogram = salary_index.histogram(column, group)
+        histogram["rango"] = [f"${lo:,.0f} - ${hi:,.0f}" for lo, hi in zip(histogram["desde"], histogram["hasta"])]
+        fig_hist = px.bar(histogram, x="rango", y="empleos", labels={"rango": "Salario", "empleos": "Empleos"})
+        fig_hist.update_layout(height=300, margin={"r": 0, "t": 10, "l": 0, "b": 0})
+        st.plotly_chart(fig_hist, use_container_width=True)
+
+        display = table.rename_axis(DISPLAY_RENAMES.get(column, column)).rename(columns={
+            "empleos": "Empleos", "min": "Mínimo", "p25": "P25", "mediana": "Mediana", "p75": "P75", "max": "Máximo"
+        })
+        st.dataframe(display.style.format("${:,.0f}", subset=display.columns[1:]), use_container_width=True)
+        st.caption("Salarios de todos los empleos cargados, uno por OPEC, sin aplicar los filtros.")
+
+
+# Count this run against the interaction (map/bar click, sidebar change) that triggered it
+begin_run()
+
+if not data.empty:
+    memory_profile.stage("filtros")
+    # Resolve the filter state before any heavy computation. Map and bar clicks
+    # were already applied by their on_select callbacks, so no extra rerun is needed.
+    salary_index = get_salary_index(data.jobs, dataset.version)
+    min_salary = int(salary_index.min)
+    max_salary = int(salary_index.max)
+    filter_state = resolve_filter_state(min_salary, max_salary)
+
+    # Full-text search scores per job (index built once per dataset, sub-millisecond queries);
+    # None, i.e. no search filter, also when the text has no searchable word
+    search_scores = None
+    if filter_state["busqueda"]:
+        search_index = get_search_index(data.jobs, dataset.version)
+        search_scores = search_index.row_scores(filter_state["busqueda"])
+
+    # Options of the cascading filters. Selections the filters above have ruled
+    # out, or that a shared link named, are dropped now (in the state and in
+    # the widgets) instead of filtering this run and vanishing on the next one.
+    filter_options, filter_state = cascade_options(data, filter_state, search_scores)
+    sync_widgets(filter_state)
+    # Keep the URL in step with the filters so the link can be shared
+    mirror_query_params(filter_state, min_salary, max_salary)
+
+    # Sidebar Filters
+
+    with st.sidebar:
+        st.header("Filtros")
         
-    if selected_convocatoria and 'convocatoria' in df.columns:
-        map_mask &= df["convocatoria"].isin(selected_convocatoria)
+        # --- Dynamic Filters ---
+        # Filters are applied sequentially to narrow down options
         
-    if selected_procesos and 'proceso' in df.columns:
-        map_mask &= df["proceso"].isin(selected_procesos)
+        # 0. Full-text search over cargo, descripción, estudio and experiencia
+        st.text_input(
+            "Buscar en los empleos",
+            placeholder="Ej: contaduria, aduan, auditor",
+            key="search_filter_widget",
+            on_change=on_sidebar_change,
+            help="Busca en cargo, descripción, estudio y experiencia. Sin tildes y por prefijo."
+        )
         
-    if selected_estudios and 'estudios_parsed' in df.columns:
-        map_mask &= df["estudios_parsed"].apply(lambda x: any(item in selected_estudios for item in x))
-
-    map_df = df[map_mask]
+        # 1. City Filter (Top Level)
+        st.multiselect("Seleccionar Ciudad", filter_options["ciudades"], key="city_filter_widget", on_change=on_sidebar_change)
+
+        # 2-5. Each filter offers what the filters above it leave (see cascade_options)
+        if filter_options["categorias"] is not None:
+            st.multiselect("Seleccionar Categoría", filter_options["categorias"], key="category_filter_widget", on_change=on_sidebar_change)
+        if filter_options["convocatorias"] is not None:
+            st.multiselect("Seleccionar Convocatoria", filter_options["convocatorias"], key="convocatoria_filter_widget", on_change=on_sidebar_change)
+        if filter_options["procesos"] is not None:
+            st.multiselect("Filtrar por Ficha", filter_options["procesos"], key="proceso_filter_widget", on_change=on_sidebar_change)
+        if filter_options["estudios"] is not None:
+            st.multiselect("Filtrar por Estudio", filter_options["estudios"], key="estudio_filter_widget", on_change=on_sidebar_change)
+        
+        # Salary Filter. Once its key holds a value (its own, or one restored from
+        # the URL) the default must not be passed as well.
+        st.slider(
+            "Rango de Salario", min_salary, max_salary,
+            None if "salary_filter_widget" in st.session_state else (min_salary, max_salary),
+            key="salary_filter_widget", on_change=on_sidebar_change
+        )
+        
+    # Filtered rows, KPIs, top-N breakdowns and map points (Empty Filter = Show All),
+    # shared with every session on the same data and filters. The bar chart's
+    # cargo selection only narrows the detail table, so it is not part of the key.
+    memory_profile.stage("resultado")
+    result_key = ("filtros", dataset.version, filter_key(filter_state, ignore=("cargo",)))
+    result = get_result_cache().get_or_compute(
+        result_key, compute_filter_result, data, filter_state, search_scores=search_scores, salary_index=salary_index
+    )
+    positions = result.positions
+
+    memory_profile.stage("asistente")
+    with st.sidebar:
+        # AI Assistant (own fragment: asking a question reruns only this panel)
+        render_assistant(data, positions)
 
     # Main Content
     
     # AI-Generated Summary
+    memory_profile.stage("resumen")
     if gemini_enabled:
-        with st.expander("📊 Resumen Generado por IA", expanded=True):
-            if st.button("🔄 Generar Resumen con Gemini", use_container_width=True):
-                with st.spinner("Generando análisis con IA..."):
-                    summary = generate_data_summary(filtered_df)
-                    if summary:
-                        st.markdown(summary)
+        summary_key = ("resumen", dataset.version, filter_key(filter_state, ignore=("cargo",)))
+        render_summary(data, positions, summary_key)
     
-    # KPIs
+    # KPIs: jobs counted and salaries averaged once per OPEC, vacancies and cities per location
+    memory_profile.stage("kpis")
+    kpis = result.kpis
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        # Use unique OPEC for total jobs since we exploded the dataframe
-        total_empleos = filtered_df['opec'].nunique() if 'opec' in filtered_df.columns else len(filtered_df)
-        st.metric("Total de Empleos (OPEC)", total_empleos)
+        st.metric("Total de Empleos (OPEC)", kpis["empleos"])
     
     with col2:
-        total_vacantes = filtered_df['vacantes_count'].sum() if 'vacantes_count' in filtered_df.columns else 0
-        st.metric("Total de Vacantes", int(total_vacantes))
+        st.metric("Total de Vacantes", kpis["vacantes"])
     
     with col3:
-        ciudades_unicas = filtered_df['ciudad'].nunique() if 'ciudad' in filtered_df.columns else 0
-        st.metric("Ciudades", ciudades_unicas)
+        st.metric("Ciudades", kpis["ciudades"])
     
     with col4:
-        # Calculate average salary based on unique jobs to avoid weighting by number of cities
-        salario_promedio = 0
-        if 'salario' in filtered_df.columns:
-            if 'opec' in filtered_df.columns:
-                salario_promedio = filtered_df.drop_duplicates('opec')['salario'].mean()
-            else:
-                salario_promedio = filtered_df['salario'].mean()
-        
-        st.metric("Salario Promedio", f"${salario_promedio:,.0f}")
+        st.metric("Salario Promedio", f"${kpis['salario_promedio']:,.0f}")
+
+    # Salary distribution per category/convocatoria/ficha (own fragment, precomputed tables)
+    memory_profile.stage("salarios")
+    render_salary_panel(salary_index)
     
     # Map
+    memory_profile.stage("mapa")
     st.subheader("Mapa de Vacantes")
-    # Ensure lat/lon columns exist and are numeric
-    map_cols = ["latitud", "longitud"]
-    if all(col in map_df.columns for col in map_cols):
-        # Drop rows with NaN in lat/lon for the map
-        map_data = map_df.dropna(subset=map_cols)
-        
-        if not map_data.empty:
-            # Group by coordinates to count vacancies per location
-            map_data_grouped = map_data.groupby(['latitud', 'longitud', 'ciudad'])['vacantes_count'].sum().reset_index()
-            
-            # Rename columns to match Plotly's expected names
-            map_data_grouped = map_data_grouped.rename(columns={
-                'latitud': 'lat',
-                'longitud': 'lon',
-                'vacantes_count': 'vacantes'
-            })
-            
+    # Vacancies per location, ignoring the city filter to allow selection (None without lat/lon columns)
+    map_data_grouped = result.map_points
+    if map_data_grouped is not None:
+        if not map_data_grouped.empty:
             # Create interactive map with Plotly (with fallback for old versions in cloud)
             try:
                 import plotly.express as px
@@ -761,7 +873,7 @@ if not df.empty:
                 )
             
             # Display the map
-            selected_points = st.plotly_chart(fig, use_container_width=True, on_select="rerun", key="map_selection")
+            selected_points = st.plotly_chart(fig, use_container_width=True, on_select=on_map_select, key="map_selection")
             
             st.caption(f"Mostrando {len(map_data_grouped)} ubicaciones en el mapa. Haz clic en un punto para filtrar por esa ciudad.")
             
@@ -772,101 +884,44 @@ if not df.empty:
                     # Get the selected city from the clicked point
                     selected_city = points[0]['hovertext']
                     st.info(f"Ciudad seleccionada en mapa: {selected_city}")
-                    # The actual filtering happens at the top of the script on the next rerun
+                    # The city filter was already applied by on_map_select before this run
         else:
             st.info("No hay datos de ubicación válidos para mostrar en el mapa.")
     else:
         st.warning("El conjunto de datos no contiene columnas de 'latitud' y 'longitud'.")
 
-    # Bar Chart
-    st.subheader("Empleos por Cargo")
-    
-    # Initialize bar selection state if not present
-    if "bar_selection_cargo" not in st.session_state:
-        st.session_state.bar_selection_cargo = None
-
-    if not filtered_df.empty:
-        import plotly.express as px
-        # Prepare data for Plotly
-        jobs_by_cargo = filtered_df["cargo"].value_counts().head(20).reset_index()
-        jobs_by_cargo.columns = ["cargo", "count"]
-        
-        # Create interactive bar chart
-        fig_bar = px.bar(
-            jobs_by_cargo, 
-            x="cargo", 
-            y="count",
-            labels={"cargo": "Cargo", "count": "Cantidad de Vacantes"},
-            color="count",
-            color_continuous_scale='Viridis'
-        )
-        
-        # Update layout for better UX
-        fig_bar.update_layout(
-            clickmode='event+select',
-            xaxis_tickangle=-45,
-            margin=dict(b=100) # Give space for labels
-        )
-        
-        # Display chart with selection enabled
-        selected_bar = st.plotly_chart(fig_bar, use_container_width=True, on_select="rerun", key="bar_selection")
-        
-        # Handle selection
-        if selected_bar and "selection" in selected_bar and "points" in selected_bar["selection"]:
-            points = selected_bar["selection"]["points"]
-            if points:
-                # Get selected cargo
-                selected_cargo = points[0]["x"]
-                st.session_state.bar_selection_cargo = selected_cargo
-                st.info(f"Filtrando por cargo: {selected_cargo}")
-            else:
-                # Deselection
-                st.session_state.bar_selection_cargo = None
-        else:
-            # Also handle case where selection is cleared via UI interaction that returns empty selection
-            st.session_state.bar_selection_cargo = None
-
-    else:
-        st.info("No hay datos para mostrar con los filtros seleccionados.")
-
-    # Apply Bar Chart Filter to the main dataframe for the table view
-    if st.session_state.bar_selection_cargo:
-        filtered_df = filtered_df[filtered_df["cargo"] == st.session_state.bar_selection_cargo]
-
-    # Dataframe
-    st.subheader("Detalle de Empleos")
-    
-    # Prepare dataframe for display
-    display_df = filtered_df.copy()
-    
-    # Rename columns
-    display_df = display_df.rename(columns={
-        'vacantes_count': 'Vacantes Ciudad Seleccionada',
-        'cargo': 'Cargo',
-        'salario': 'Salario',
-        'ciudad': 'Ciudad',
-        'categoria': 'Categoría',
-        'convocatoria': 'Convocatoria',
-        'opec': 'OPEC',
-        'estudio': 'Estudio',
-        'experiencia': 'Experiencia',
-        'Cantidad de Vacantes': 'Numero de vacantes del proceso',
-        'cantidad de vacantes': 'Numero de vacantes del proceso',
-        'proceso': 'Ficha',
-        'Proceso': 'Ficha',
-        'descripcion': 'Descripción',
-        'Descripción': 'Descripción'
-    })
-    
-    # Drop unnecessary columns
-    # User requested to hide 'proceso' from the table but keep 'estudio' and 'experiencia'
-    cols_to_drop = ['latitud', 'longitud', 'ciudad_raw', 'Grado', 'Código Empleo', 'Codigo Empleo', 'codigo_empleo', 'Nivel', 'vacantes_raw', 'estudios_parsed']
-    # Drop columns case-insensitive
-    for col in display_df.columns:
-        if any(drop_col.lower() == col.lower() for drop_col in cols_to_drop):
-            display_df = display_df.drop(columns=[col])
-            
-    st.dataframe(display_df, use_container_width=True)
+    # Bar chart and detail table (own fragment: a bar click reruns only this section)
+    render_cargo_section(data, positions, result.breakdowns)
 
 else:
     st.info("No hay datos disponibles o no se pudo conectar a la base de datos.")
+
+end_run()
+
+with st.sidebar:
+    with st.expander("📈 Diagnóstico de Rendimiento"):
+        st.caption(
+            f"Datos: versión {dataset.version} ({dataset.source or 'sin fuente'}), "
+            f"actualizados hace {int(time.time() - dataset.loaded_at)} s"
+        )
+        if source_health is not None:
+            st.caption(f"Fuente remota: {source_health.describe()}")
+        feed = get_change_feed()
+        watched = [name for name in ("supabase", "local") if feed.live(name)]
+        st.caption(
+            f"Cambios notificados: {', '.join(watched) or 'ninguno'} · "
+            f"recarga programada cada {int(get_dataset_store(selected_years).current_refresh_interval() / 60)} min"
+        )
+        results = get_result_cache()
+        st.caption(
+            f"Caché de resultados: {len(results)} filtros, {results.nbytes / 1024:,.0f} KB, "
+            f"{results.hits} aciertos / {results.misses} cálculos"
+        )
+        stages = memory_history()
+        if stages:
+            st.caption("Memoria por etapa de la última ejecución (perfilado activo).")
+            st.dataframe(pd.DataFrame(stages), hide_index=True, use_container_width=True)
+        history = rerun_history()
+        if history:
+            st.caption("Ejecuciones del script por interacción (lo esperado es 1).")
+            st.dataframe(pd.DataFrame(history), hide_index=True, use_container_width=True)
@@ -0,0 +1,108 @@
+"""Ficha (proceso) and NBC features extracted from the job text columns.
+
+Both are computed once per distinct source text with vectorized string
+operations and returned as categoricals, so every row only holds a small
+integer code however many rows share the same text.
+
+NBCs (Núcleos Básicos de Conocimiento) are a set per job. A row's set is stored
+as one category whose label is the sorted NBC names joined by ``NBC_SEPARATOR``;
+use ``nbc_options``, ``nbc_match`` and ``nbc_counts`` instead of splitting
+labels by hand.
+"""
+import numpy as np
+import pandas as pd
+
+NBC_SEPARATOR = "\x1f"
+
+
+def _encode(codes, labels, uniques_count):
+    """Categorical for rows whose source text has factorize code ``codes``.
+
+    ``labels`` holds the feature for each distinct text plus, at position
+    ``uniques_count``, the value for missing text.
+    """
+    label_codes, categories = pd.factorize(pd.Series(labels, dtype=object), sort=True)
+    rows = np.where(codes >= 0, codes, uniques_count)
+    return pd.Categorical.from_codes(label_codes[rows], categories=categories)
+
+
+def extract_proceso(descripcion, missing="Desconocido"):
+    """Ficha code such as "IT-IT" from the start of each description.
+
+    Same rules as the original per-row parser: a leading ``XX-XX`` in capitals,
+    else the first two ``-`` separated parts when both are two characters long,
+    else "Otros"; non-text values give ``missing``.
+    """
+    codes, uniques = pd.factorize(descripcion)
+    texts = pd.Series(uniques, dtype=object)
+    is_text = texts.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    texts = texts[is_text].astype(str)
+
+    labels = np.full(len(uniques) + 1, missing, dtype=object)
+    found = texts.str.extract(r"^([A-Z]{2}-[A-Z]{2})", expand=False)
+
+    parts = texts.str.split("-", n=2, regex=False)
+    first = parts.str[0].str.strip()
+    second = parts.str[1].str.strip()
+    fallback = (first + "-" + second).where(
+        (parts.str.len() > 1) & (first.str.len() == 2) & (second.str.len() == 2), "Otros"
+    )
+    labels[np.flatnonzero(is_text)] = found.fillna(fallback).to_numpy(dtype=object)
+    return _encode(codes, labels, len(uniques))
+
+
+def extract_nbc(estudio):
+    """Set of NBC names after each "NBC:" marker, up to the next " ,O," separator"""
+    codes, uniques = pd.factorize(estudio)
+    texts = pd.Series(uniques, dtype=object)
+    is_text = texts.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    texts = texts[is_text].astype(str)
+
+    # One row per "NBC:" segment, keeping which distinct text it came from
+    segments = texts.str.replace("\n", " ", regex=False).str.strip().str.split("NBC:", regex=False).explode()
+    segments = segments[segments.groupby(level=0).cumcount() > 0]
+    names = segments.str.strip().str.split(" ,O,", regex=False).str[0].str.strip(" .")
+    names = names[names.str.len() > 0]
+
+    labels = np.full(len(uniques) + 1, "", dtype=object)
+    if len(names):
+        joined = (
+            names.groupby(level=0)
+            .agg(lambda values: NBC_SEPARATOR.join(sorted(set(values))))
+        )
+        labels[joined.index.to_numpy()] = joined.to_numpy(dtype=object)
+    return _encode(codes, labels, len(uniques))
+
+
+def _category_sets(column):
+    return [set(label.split(NBC_SEPARATOR)) if label else set() for label in column.cat.categories]
+
+
+def nbc_options(column):
+    """Every NBC appearing in the rows of an ``extract_nbc`` column"""
+    used = np.unique(column.cat.codes.to_numpy())
+    sets = _category_sets(column)
+    return set().union(*(sets[code] for code in used if code >= 0))
+
+
+def nbc_counts(column, category_counts):
+    """Rows per NBC name from rows per category of an ``extract_nbc`` column.
+
+    A row whose set holds several NBCs counts once for each. Returns
+    ``(counts, names)`` with names sorted.
+    """
+    sets = _category_sets(column)
+    names = sorted(set().union(*sets))
+    position = {name: i for i, name in enumerate(names)}
+    counts = np.zeros(len(names), dtype=np.int64)
+    for code, items in enumerate(sets):
+        for name in items:
+            counts[position[name]] += category_counts[code]
+    return counts, np.array(names, dtype=object)
+
+
+def nbc_match(column, wanted):
+    """Boolean mask of the rows whose NBC set contains any of ``wanted``"""
+    wanted = set(wanted)
+    hits = np.array([not wanted.isdisjoint(items) for items in _category_sets(column)] + [False])
+    return hits[column.cat.codes.to_numpy()]
@@ -0,0 +1,111 @@
+"""Check the push-based dataset invalidation against local stand-ins.
+
+    python verify_change_watch.py
+
+- a temp file stands in for an export file: touching it must not count as a
+  change, rewriting it must;
+- the Realtime stand-in of loadtest_stub.py stands in for Supabase: a burst of
+  row events must reach the dataset store as a single reload.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from change_watch import ChangeFeed, FileWatcher, RealtimeWatcher
+from dataset_store import DatasetStore
+from jobs_model import JobsDataset, single_locations
+from loadtest_stub import FAKE_KEY, TABLE, RealtimeStub
+
+failures = []
+
+
+def check(label, ok, detail=""):
+    print(f"[{'OK' if ok else 'FAIL'}] {label}{f' ({detail})' if detail else ''}")
+    if not ok:
+        failures.append(label)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def tiny_dataset(n_jobs):
+    jobs = pd.DataFrame({
+        "opec": range(n_jobs), "cargo": "GESTOR I", "salario": 5000000,
+        "convocatoria": "Ingreso", "anio": 2025, "ciudad": "Cali", "vacantes_count": 1,
+    })
+    return JobsDataset(*single_locations(jobs))
+
+
+def verify_file_watcher():
+    changes = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "EmpleosDIAN_2025.xlsx")
+        with open(path, "wb") as fh:
+            fh.write(b"version 1")
+        watcher = FileWatcher(lambda: [path], changes.append, interval=3600).start()
+
+        check("unchanged file is not reported", not watcher.check())
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        check("touched file with the same content is not reported", not watcher.check())
+        with open(path, "wb") as fh:
+            fh.write(b"version 2")
+        check("rewritten file is reported", watcher.check() and changes == ["local"])
+        os.remove(path)
+        check("removed file is reported", watcher.check())
+        watcher.stop()
+
+
+def verify_realtime():
+    stub = RealtimeStub().start()
+    feed = ChangeFeed(quiet_period=0.5)
+    loads = []
+
+    def loader(previous):
+        loads.append(time.perf_counter())
+        data = tiny_dataset(10 if len(loads) == 1 else 11)
+        data.attrs["fuente"] = "supabase"
+        return data
+
+    store = DatasetStore(loader, refresh_interval=600, change_feed=feed)
+    first = store.get()
+    feed.add_watcher("supabase", RealtimeWatcher(stub.url, FAKE_KEY, TABLE, feed.notify))
+    check("realtime subscription is live", wait_for(lambda: feed.live("supabase")), f"{stub.subscribers} subscriber")
+    check("timed reloads slow down while changes are pushed", store.current_refresh_interval() == store.watched_refresh_interval)
+
+    # An upload in batches: many row events in a short burst
+    sent = time.perf_counter()
+    for i in range(50):
+        stub.notify_change("INSERT", {"Opec": 900000 + i})
+    reloaded = wait_for(lambda: store.get().version != first.version)
+    latency = (loads[-1] - sent) if len(loads) > 1 else float("nan")
+    check("a burst of 50 events reloads the dataset", reloaded, f"{feed.events.get('supabase', 0)} events received")
+    time.sleep(1.0)
+    check("the burst causes exactly one reload", len(loads) == 2, f"{len(loads) - 1} reloads")
+    check(
+        "reload starts within quiet period + 1 s of the last event",
+        latency < feed.quiet_period + 1.0, f"{latency * 1000:.0f} ms, quiet period {feed.quiet_period * 1000:.0f} ms",
+    )
+
+    store.invalidate("local")
+    time.sleep(0.2)
+    check("local file changes are ignored while Supabase data is served", len(loads) == 2)
+
+    stub.stop()
+    check("losing the connection stops the push status", wait_for(lambda: not feed.live("supabase"), timeout=5))
+    check("timed reloads fall back to the normal interval", store.current_refresh_interval() == store.refresh_interval)
+
+
+if __name__ == "__main__":
+    verify_file_watcher()
+    verify_realtime()
+    print("\nAll checks passed" if not failures else f"\n{len(failures)} checks failed")
+    sys.exit(1 if failures else 0)
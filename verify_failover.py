@@ -0,0 +1,156 @@
+"""Measure failover to the local data while Supabase hangs, and the way back.
+
+    python verify_failover.py
+
+The PostgREST stand-in of loadtest_stub.py is made to hang (``postgrest_delay``)
+to play an outage where the host accepts connections but never answers:
+
+- the first load must fall back to the local data within the probe timeout,
+  not after a full HTTP timeout;
+- while the source is degraded, loads must not touch it at all;
+- once the stub answers again the dataset must switch back to Supabase on its
+  own, through the background probe and the change feed.
+"""
+import sys
+import time
+
+import httpx
+import pandas as pd
+from supabase import ClientOptions, create_client
+
+from change_watch import ChangeFeed
+from dataset_store import DatasetStore
+from jobs_model import JobsDataset, single_locations
+from loadtest_stub import FAKE_KEY, TABLE, StubServer
+from source_health import DEGRADED, HEALTHY, SourceHealth, postgrest_probe
+
+PROBE_TIMEOUT = 1.0
+# Read timeout of the unprobed reference read (the client's default is 120 s)
+READ_TIMEOUT = 5.0
+HANG = 60.0
+
+failures = []
+
+
+def check(label, ok, detail=""):
+    print(f"[{'OK' if ok else 'FAIL'}] {label}{f' ({detail})' if detail else ''}")
+    if not ok:
+        failures.append(label)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def to_dataset(rows, source):
+    jobs = pd.DataFrame(rows)[["Opec", "Denominación", "Asignación Salarial"]]
+    jobs.columns = ["opec", "cargo", "salario"]
+    jobs["ciudad"] = "Bogotá"
+    data = JobsDataset(*single_locations(jobs))
+    data.attrs["fuente"] = source
+    return data
+
+
+def build(stub):
+    client = create_client(stub.url, FAKE_KEY, options=ClientOptions(
+        postgrest_client_timeout=httpx.Timeout(10, connect=PROBE_TIMEOUT)
+    ))
+    feed = ChangeFeed(quiet_period=0.1)
+    health = SourceHealth(
+        "supabase", postgrest_probe(stub.url, FAKE_KEY, TABLE), timeout=PROBE_TIMEOUT,
+        min_backoff=0.5, max_backoff=2.0, on_recover=feed.notify,
+    )
+    local = to_dataset(stub.rows[:50], "local")
+    remote_reads = []
+
+    # Same decisions as load_data in streamlit_app.py
+    def load(sources=("supabase", "local")):
+        if "supabase" in sources and health.available():
+            remote_reads.append(time.time())
+            try:
+                response = client.table(TABLE).select("*").execute()
+            except Exception as e:
+                health.mark_failed(e)
+            else:
+                health.mark_ok()
+                return to_dataset(response.data, "supabase")
+        return local if "local" in sources else JobsDataset.empty_dataset()
+
+    def loader(previous):
+        if previous is not None and previous.source == "supabase":
+            return load(sources=("supabase",))
+        return load()
+
+    return DatasetStore(loader, refresh_interval=600, change_feed=feed), health, remote_reads
+
+
+def unprobed_read(stub):
+    """What a load cost before the probe: the full read until its timeout"""
+    client = create_client(stub.url, FAKE_KEY, options=ClientOptions(postgrest_client_timeout=READ_TIMEOUT))
+    started = time.perf_counter()
+    try:
+        client.table(TABLE).select("*").execute()
+    except Exception:
+        pass
+    return time.perf_counter() - started
+
+
+def verify_failover():
+    stub = StubServer(n_rows=200, gemini_delay=0).start()
+    stub.postgrest_delay = HANG
+    print(f"Reference: an unprobed read blocks for {unprobed_read(stub) * 1000:.0f} ms (read timeout {READ_TIMEOUT:.0f} s)")
+    store, health, remote_reads = build(stub)
+
+    started = time.perf_counter()
+    first = store.get()
+    failover = time.perf_counter() - started
+    check("first load falls back to the local data", first.source == "local", f"fuente {first.source}")
+    check(
+        "failover takes about one probe timeout, not a read timeout",
+        failover < PROBE_TIMEOUT + 0.5, f"{failover * 1000:.0f} ms, probe timeout {PROBE_TIMEOUT * 1000:.0f} ms",
+    )
+    check("the source is marked degraded", health.state == DEGRADED, health.describe())
+    check("the full table read was never attempted", not remote_reads)
+
+    store.request_refresh()
+    time.sleep(0.2)
+    started = time.perf_counter()
+    store.get()
+    check(
+        "loads while degraded do not wait for the source", time.perf_counter() - started < 0.05 and not remote_reads,
+        f"{(time.perf_counter() - started) * 1000:.1f} ms",
+    )
+
+    # The outage ends
+    stub.postgrest_delay = 0.0
+    recovered_from = time.perf_counter()
+    back = wait_for(lambda: store.get().source == "supabase", timeout=15)
+    switch_back = time.perf_counter() - recovered_from
+    check("the dataset switches back to Supabase on its own", back, f"{switch_back * 1000:.0f} ms after recovery")
+    check("the source is healthy again", health.state == HEALTHY, health.describe())
+    check("switched back within the longest backoff + 1 s", switch_back < health.max_backoff + 1.0)
+
+    # A new outage while Supabase data is served keeps that data
+    stub.postgrest_delay = HANG
+    health.checked_at = 0  # force a probe on the next load
+    served = store.get().version
+    store.request_refresh()
+    wait_for(lambda: health.state == DEGRADED, timeout=5)
+    time.sleep(0.2)
+    current = store.get()
+    check(
+        "an outage while serving Supabase keeps the Supabase data",
+        current.source == "supabase" and current.version == served, f"fuente {current.source}",
+    )
+    stub.stop()
+
+
+if __name__ == "__main__":
+    verify_failover()
+    print("\nAll checks passed" if not failures else f"\n{len(failures)} checks failed")
+    sys.exit(1 if failures else 0)
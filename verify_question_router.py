@@ -0,0 +1,89 @@
+"""Check which questions the local router answers and which it leaves to Gemini.
+
+    python verify_question_router.py
+
+Runs ``question_router.answer_locally`` on a small frame shaped like the
+dashboard's (one row per OPEC and city). Questions about a job or place that
+is not in the data must return None, so Gemini answers them, and a place
+without rows must get "no jobs", never the aggregate over everything the
+router did recognise. ``FILTERED`` plays the dashboard with the Cali filter on.
+"""
+import sys
+
+import pandas as pd
+
+from question_router import answer_locally
+
+JOBS = pd.DataFrame([
+    # opec, cargo, salario, convocatoria, ciudad, vacantes_count
+    (1001, "GESTOR I", 6811546, "DIAN 2676 Ingreso", "Cali", 14),
+    (1001, "GESTOR I", 6811546, "DIAN 2676 Ingreso", "Bogotá, D.C.", 40),
+    (1002, "GESTOR II", 7988200, "DIAN 2676 Ingreso", "Cali", 4),
+    (1003, "ANALISTA II", 4655747, "DIAN 2677 Ascenso", "Medellín", 6),
+    (1004, "ANALISTA III", 5428428, "DIAN 2677 Ascenso", "Cali", 2),
+], columns=["opec", "cargo", "salario", "convocatoria", "ciudad", "vacantes_count"])
+
+FILTERED = JOBS[JOBS["ciudad"] == "Cali"]
+
+# question -> (intent, text in the answer); intent None = left to Gemini
+EXPECTED = {
+    # Entities the data does not know about
+    "¿cuántas vacantes hay para abogados en Cali?": (None, None),
+    "¿cuántas vacantes hay para contadores?": (None, None),
+    "¿Cuál es el salario de un ingeniero?": (None, None),
+    # Places without any rows
+    "¿cuántas vacantes hay en Leticia?": ("sin_datos", "No hay empleos en Leticia"),
+    "¿cuántas vacantes hay para Leticia?": ("sin_datos", "No hay empleos en Leticia"),
+    "¿Cuál es el cargo mejor pagado en Pasto?": ("sin_datos", "No hay empleos en Pasto"),
+    "¿cuál es el salario promedio en Leticia?": ("sin_datos", "No hay empleos en Leticia"),
+    "¿cuántas vacantes hay en Cali y Leticia?": ("conteo_vacantes", "**20** vacantes en Cali, Leticia"),
+    # Entities it does know about
+    "¿cuántas vacantes hay en Cali?": ("conteo_vacantes", "**20** vacantes en Cali"),
+    "¿cuántas vacantes hay para Cali?": ("conteo_vacantes", "**20** vacantes en Cali"),
+    "¿cuántas vacantes hay para el cargo gestor ii en Cali?": ("conteo_vacantes", "**4** vacantes"),
+    "¿Cuál es el salario de un analista ii?": ("salario", "promedio $4,655,747"),
+    "¿cuántas vacantes hay para ascenso?": ("conteo_vacantes", "**8** vacantes"),
+    # Generic wording, no entity at all
+    "¿cuál es el total de vacantes?": ("conteo_vacantes", "**66** vacantes"),
+    "¿cuál es el promedio de salario?": ("salario", "(4 empleos)"),
+    "¿cuántos empleos hay?": ("conteo_empleos", "**4** empleos OPEC"),
+    # Not an aggregate
+    "¿por qué hay más vacantes en Cali?": (None, None),
+}
+
+# Same, asked with only the Cali rows left by the filters
+EXPECTED_FILTERED = {
+    "¿Cuántas vacantes hay en Bogotá?": ("sin_datos", "No hay empleos en Bogotá, D.C."),
+    "¿cuál es el salario promedio en Medellín?": ("sin_datos", "No hay empleos en Medellín"),
+    "¿cuántas vacantes hay en Cali?": ("conteo_vacantes", "**20** vacantes en Cali"),
+    "¿cuántas vacantes hay?": ("conteo_vacantes", "**20** vacantes"),
+}
+
+failures = []
+
+
+def check(label, ok, detail=""):
+    print(f"[{'OK' if ok else 'FAIL'}] {label}{f' ({detail})' if detail else ''}")
+    if not ok:
+        failures.append(label)
+
+
+def verify_answers(expected, dataframe, label=""):
+    for question, (intent, fragment) in expected.items():
+        result = answer_locally(question, dataframe)
+        if intent is None:
+            check(label + question, result is None, "Gemini" if result is None else f"local '{result[0]}': {result[1]}")
+            continue
+        ok = result is not None and result[0] == intent and fragment in result[1]
+        check(label + question, ok, result[1].splitlines()[0] if result else "Gemini")
+
+
+def verify_question_router():
+    verify_answers(EXPECTED, JOBS)
+    verify_answers(EXPECTED_FILTERED, FILTERED, label="[Cali] ")
+
+
+if __name__ == "__main__":
+    verify_question_router()
+    print("\nAll checks passed" if not failures else f"\n{len(failures)} checks failed")
+    sys.exit(1 if failures else 0)